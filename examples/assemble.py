@@ -1,4 +1,6 @@
 
+from typing import Iterable
+
 import argparse
 import pathlib
 
@@ -9,21 +11,45 @@ def main() -> None:
     # Input path
     cml_parser = argparse.ArgumentParser()
     cml_parser.add_argument("--input", type=str, help="Input file path.")
+    cml_parser.add_argument("--format", type=str, default="hack",
+                            choices=["hack", "bin", "npy"],
+                            help="Output format.")
+    cml_parser.add_argument("--optimize", action="store_true",
+                            help="Whether to run peephole optimizer.")
+    cml_parser.add_argument("--vm-rules", action="store_true",
+                            help="Whether to add stack rules of optimizer, "
+                            "only valid for code from VM translator.")
+    cml_parser.add_argument("--map", action="store_true",
+                            help="Whether to write symbol map files.")
     args = cml_parser.parse_args()
     input_path = pathlib.Path(args.input)
 
-    # Read file
+    output_path = input_path.parent / (input_path.stem + "." + args.format)
     with input_path.open("r") as f:
-        lines = f.readlines()
-
-    # Assemble
-    hack_assembler = assembler.Assembler(lines)
-    binary = hack_assembler.assemble()
-
-    # Write parsed binary to file
-    output_path = input_path.parent / (input_path.stem + ".hack")
-    with output_path.open("w") as f:
-        f.write("\n".join(binary))
+        lines: Iterable[str] = f
+        if args.optimize:
+            rules = assembler.PeepholeOptimizer.default_rules
+            if args.vm_rules:
+                rules = rules + assembler.PeepholeOptimizer.stack_rules
+            optimizer = assembler.PeepholeOptimizer(rules)
+            lines = optimizer.optimize(f)
+
+        # Assemble and write binary to file
+        hack_assembler = assembler.Assembler(lines)
+        words = hack_assembler.iter_words()
+        if args.format == "hack":
+            assembler.write_hack(words, output_path)
+        elif args.format == "bin":
+            assembler.write_binary(words, output_path)
+        else:
+            assembler.write_npy(words, output_path)
+
+    if args.map:
+        symbol_map = hack_assembler.symbol_map()
+        map_path = input_path.parent / (input_path.stem + ".map")
+        assembler.write_map_text(symbol_map, map_path)
+        assembler.write_map_json(
+            symbol_map, map_path.with_suffix(".map.json"))
 
 
 if __name__ == "__main__":
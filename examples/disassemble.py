@@ -0,0 +1,30 @@
+
+import argparse
+import pathlib
+
+from nnttpy import assembler
+
+
+def main() -> None:
+    # Input path
+    cml_parser = argparse.ArgumentParser()
+    cml_parser.add_argument("--input", type=str, help="Input file path.")
+    args = cml_parser.parse_args()
+    input_path = pathlib.Path(args.input)
+
+    # Read file
+    with input_path.open("r") as f:
+        words = [int(line, 2) for line in f if line.strip()]
+
+    # Disassemble
+    disassembler = assembler.Disassembler()
+    code = disassembler.disassemble(words)
+
+    # Write decoded code to file
+    output_path = input_path.parent / (input_path.stem + ".asm")
+    with output_path.open("w") as f:
+        f.write("\n".join(code))
+
+
+if __name__ == "__main__":
+    main()
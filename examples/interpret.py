@@ -0,0 +1,30 @@
+
+import argparse
+import time
+
+from nnttpy import vmtranslator
+
+
+def main() -> None:
+    # Input path
+    cml_parser = argparse.ArgumentParser()
+    cml_parser.add_argument("--input", type=str, help="Input file path.")
+    cml_parser.add_argument("--max-steps", type=int, default=None,
+                            help="Maximum number of commands to run.")
+    args = cml_parser.parse_args()
+
+    # Run
+    interpreter = vmtranslator.VMInterpreter()
+    interpreter.load(args.input)
+    start = time.perf_counter()
+    steps = interpreter.run(args.max_steps)
+    elapsed = time.perf_counter() - start
+
+    print(f"Executed {steps} commands in {elapsed:.3f} s "
+          f"({'halted' if interpreter.halted else 'stopped'})")
+    for name, address in interpreter.statics.items():
+        print(f"{name} = {interpreter.ram[address]}")
+
+
+if __name__ == "__main__":
+    main()
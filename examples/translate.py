@@ -1,24 +1,75 @@
 
 import argparse
+import json
 import pathlib
 
-from nnttpy import vmtranslator
+from nnttpy import assembler, vmtranslator
 
 
 def main() -> None:
     # Input path
     cml_parser = argparse.ArgumentParser()
     cml_parser.add_argument("--input", type=str, help="Input file path.")
+    cml_parser.add_argument("--cache-tos", action="store_true",
+                            help="Keep top of stack in D register.")
+    cml_parser.add_argument("--shared-calls", action="store_true",
+                            help="Use shared call and return routines.")
+    cml_parser.add_argument("--compare", type=str, default="inline",
+                            choices=["inline", "shared", "auto"],
+                            help="Code of eq, gt and lt.")
+    cml_parser.add_argument("--eliminate-dead", action="store_true",
+                            help="Remove functions unreachable from Sys.init.")
+    cml_parser.add_argument("--inline", action="store_true",
+                            help="Inline calls of small functions.")
+    cml_parser.add_argument("--fold", action="store_true",
+                            help="Fold constant arithmetic.")
+    cml_parser.add_argument("--fuse", action="store_true",
+                            help="Fuse common command sequences.")
+    cml_parser.add_argument("--report", type=str, default="",
+                            help="Output path of JSON cost report.")
+    cml_parser.add_argument("--source-map", type=str, default="",
+                            help="Output path of JSON source map.")
+    cml_parser.add_argument("--hack", action="store_true",
+                            help="Write machine code instead of assembly.")
+    cml_parser.add_argument("--workers", type=int, default=0,
+                            help="Translate files in parallel processes.")
     args = cml_parser.parse_args()
     input_path = pathlib.Path(args.input)
 
-    translator = vmtranslator.VMTranslator()
-    assemle_code = translator.translate(input_path)
+    translator = vmtranslator.VMTranslator(
+        cache_tos=args.cache_tos, shared_calls=args.shared_calls,
+        compare=args.compare, eliminate_dead=args.eliminate_dead,
+        inline=args.inline, fold_constants=args.fold,
+        fuse=args.fuse, report=bool(args.report),
+        source_map=bool(args.source_map))
+    # Write machine code, or assemble code streamed unless translated in
+    # parallel
+    if args.hack:
+        assembler.write_hack(translator.translate_to_rom(input_path),
+                             input_path.parent / (input_path.stem + ".hack"))
+    else:
+        output_path = input_path.parent / (input_path.stem + ".asm")
+        with output_path.open("w") as f:
+            if args.workers > 0:
+                f.write("\n".join(translator.translate_parallel(
+                    input_path, max_workers=args.workers)))
+            else:
+                translator.translate_to_file(input_path, f)
 
-    # Write parsed assemble code to file
-    output_path = input_path.parent / (input_path.stem + ".asm")
-    with output_path.open("w") as f:
-        f.write("\n".join(assemle_code))
+    for name, count in translator.inlined.items():
+        print(f"Inlined function: {name} ({count} sites)")
+    for name in translator.removed:
+        print(f"Removed unreachable function: {name}")
+    if args.fuse:
+        for name, count in translator.fusion_hits.items():
+            print(f"Fused {name}: {count}")
+    if args.report:
+        with open(args.report, "w") as f:
+            f.write(translator.report.to_json())
+        print(translator.report.to_text(limit=10))
+    if args.source_map:
+        with open(args.source_map, "w") as f:
+            json.dump(translator.source_map.to_dict(), f)
 
 
 if __name__ == "__main__":
@@ -1,4 +1,8 @@
-
 from .assembler import Assembler
 from .code import Converter
-from .parser import Parser
+from .disassembler import Disassembler
+from .linker import ObjectModule, Linker
+from .optimizer import PeepholeRule, PeepholeOptimizer
+from .parser import Instruction, Parser
+from .writer import (write_binary, write_hack, write_npy, write_map_json,
+                     write_map_text)
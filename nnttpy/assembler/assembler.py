@@ -1,7 +1,12 @@
+from typing import Iterable, Iterator, List, Dict, Optional, Tuple
 
-from typing import List, Dict
+import array
+import bisect
+import concurrent.futures
+import heapq
+import os
 
-from nnttpy import assembler
+from nnttpy import assembler, sourcemap
 
 
 class Assembler:
@@ -18,91 +23,539 @@ class Assembler:
     }
     ram_predefined = 16
 
-    def __init__(self, code: List[str]):
+    def __init__(self, code: Iterable[str]):
 
-        self.parser = assembler.Parser(code)
+        self._code = code
+        self._parser: Optional[assembler.Parser] = None
         self.converter = assembler.Converter()
         self.symbol_table: Dict[str, str] = {}
+        self._symbols: Dict[str, int] = {}
+        self._variables: Dict[str, int] = {}
+        self._rom_size = 0
 
-    def assemble(self) -> List[str]:
+        # State kept by `reassemble`
+        self._inc_lines: List[str] = []
+        self._inc_line_words = bytearray()
+        self._inc_words = array.array("H")
+        self._inc_labels: Dict[str, Tuple[int, int]] = {}
+        self._inc_refs: List[Tuple[int, str]] = []
+
+    @property
+    def parser(self) -> "assembler.Parser":
+        """Parser of given code, created on first access."""
+
+        if self._parser is None:
+            self._parser = assembler.Parser(self._lines())
+        return self._parser
+
+    def assemble(self, single_pass: bool = False) -> List[str]:
         """Assembles given code.
 
         1. Create symbol table.
         2. Convert assemble code to binary.
 
+        Args:
+            single_pass (bool, optional): If `True`, walks the code only once
+                and backpatches forward label references (see
+                `assemble_iter`).
+
         Returns:
             binary (list[str]): Binarized code.
         """
 
-        self._create_symbol_table()
-        binary = self._convert_code()
-        return binary
+        return [f"{word:016b}" for word in self.assemble_words(single_pass)]
+
+    def assemble_words(self, single_pass: bool = False) -> array.array:
+        """Assembles given code to 16-bit words.
+
+        Args:
+            single_pass (bool, optional): If `True`, walks the code only once
+                and backpatches forward label references.
+
+        Returns:
+            words (array.array): Machine code of typecode 'H'. Its buffer can
+                be used as a ROM image as is, e.g. `memoryview(words)`.
+        """
+
+        if single_pass:
+            words = array.array("H", self._single_pass())
+        else:
+            self._create_symbol_table(self.parser.instructions)
+            words = array.array("H", self._convert_code(
+                self.parser.instructions))
+
+        self._update_symbol_table(len(words))
+        return words
+
+    def iter_words(self) -> Iterator[int]:
+        """Assembles given code lazily to 16-bit words.
+
+        If the code can be read twice, i.e. a sequence or a seekable file
+        which is read from the start, labels are collected in a first pass
+        and each word is yielded as soon as it is encoded in a second pass.
+        Otherwise, e.g. for a generator, the code is assembled in a single
+        pass as `assemble_iter`.
+
+        Yields:
+            word (int): Machine code.
+        """
+
+        if self._parser is None and iter(self._code) is self._code and not (
+                hasattr(self._code, "seekable") and self._code.seekable()):
+            words = self._single_pass()
+        else:
+            self._create_symbol_table(self._iter_instructions())
+            words = self._convert_code(self._iter_instructions())
+
+        rom_size = 0
+        for word in words:
+            yield word
+            rom_size += 1
+
+        self._update_symbol_table(rom_size)
+
+    def assemble_iter(self) -> Iterator[str]:
+        """Assembles given code in a single pass.
+
+        Each instruction is encoded as soon as it is read. A-commands whose
+        symbol is not known yet are left as holes and patched when the label
+        is declared; symbols still unresolved at the end of the code are
+        allocated in RAM in first-seen order. Words are yielded as soon as
+        every preceding word has been resolved.
+
+        Yields:
+            binary (str): Binarized code.
+        """
+
+        rom_size = 0
+        for word in self._single_pass():
+            yield f"{word:016b}"
+            rom_size += 1
+
+        self._update_symbol_table(rom_size)
+
+    def assemble_parallel(self, max_workers: Optional[int] = None,
+                          chunk_size: Optional[int] = None) -> array.array:
+        """Assembles given code in chunks with a process pool.
+
+        Each worker parses its chunk, encodes everything but symbolic
+        A-commands and collects chunk-local labels. Labels are then merged
+        with ROM offsets of the chunks and the remaining references are
+        resolved in source order, so variables get the same RAM addresses
+        as in `assemble_words`.
+
+        Args:
+            max_workers (int, optional): Number of processes. Defaults to the
+                number of CPUs.
+            chunk_size (int, optional): Number of lines per chunk. Defaults to
+                an equal split over the workers.
+
+        Returns:
+            words (array.array): Machine code of typecode 'H'.
+        """
+
+        code = self._lines()
+        if max_workers is None:
+            max_workers = os.cpu_count() or 1
+        if chunk_size is None:
+            chunk_size = -(-len(code) // max_workers)
+        chunk_size = max(chunk_size, 1)
+
+        chunks = [code[i:i + chunk_size]
+                  for i in range(0, len(code), chunk_size)]
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+            results = list(executor.map(_assemble_chunk, chunks))
+
+        # Merge label symbols with ROM offset of each chunk
+        self._symbols = self._predefined_table()
+        offset = 0
+        for words, _, labels, _ in results:
+            for symbol, (address, _) in labels.items():
+                if symbol in self._symbols:
+                    raise ValueError(f"Duplicated label symbol: {symbol}.")
+                self._symbols[symbol] = offset + address
+            offset += len(words)
+
+        # Resolve symbols in source order to keep RAM allocation order
+        res = array.array("H")
+        self._variables = {}
+        ram_address = self.ram_predefined
+        for words, _, _, refs in results:
+            for index, symbol in refs:
+                if symbol not in self._symbols:
+                    self._symbols[symbol] = ram_address
+                    self._variables[symbol] = ram_address
+                    ram_address += 1
+                words[index] = self._symbols[symbol]
+            res.extend(words)
+
+        self._update_symbol_table(len(res))
+        return res
+
+    def reassemble(self, code: Optional[Iterable[str]] = None
+                   ) -> array.array:
+        """Re-assembles edited code incrementally.
+
+        Lines, ROM and symbols of the previous call are kept. Only the lines
+        between the common prefix and suffix of the previous and given code
+        are parsed and encoded; symbolic A-commands are then resolved again,
+        which patches the ones whose address moved. The first call assembles
+        the whole code.
+
+        Args:
+            code (list of str, optional): Edited assemble code. Defaults to
+                the code given at construction.
+
+        Returns:
+            words (array.array): Machine code of typecode 'H'.
+        """
+
+        code = self._lines() if code is None else list(code)
+
+        # Common prefix and suffix lines
+        old = self._inc_lines
+        n_old = len(old)
+        n_new = len(code)
+        limit = min(n_old, n_new)
+        head = 0
+        while head < limit and old[head] == code[head]:
+            head += 1
+        tail = 0
+        while (tail < limit - head
+               and old[n_old - 1 - tail] == code[n_new - 1 - tail]):
+            tail += 1
+
+        # Encode changed lines
+        mid_words, mid_line_words, mid_labels, mid_refs = _assemble_chunk(
+            code[head:n_new - tail])
+
+        old_end = n_old - tail
+        rom_start = sum(self._inc_line_words[:head])
+        rom_end = rom_start + sum(self._inc_line_words[head:old_end])
+        delta_rom = len(mid_words) - (rom_end - rom_start)
+        delta_line = (n_new - tail) - old_end
+
+        # Shift labels after the change
+        labels: Dict[str, Tuple[int, int]] = {}
+        for symbol, (address, line) in self._inc_labels.items():
+            if line < head:
+                labels[symbol] = (address, line)
+            elif line >= old_end:
+                labels[symbol] = (address + delta_rom, line + delta_line)
+
+        symbols = self._predefined_table()
+        for symbol, (address, line) in mid_labels.items():
+            if symbol in labels or symbol in symbols:
+                raise ValueError(f"Duplicated label symbol: {symbol}.")
+            labels[symbol] = (rom_start + address, head + line)
+        for symbol, (address, _) in labels.items():
+            symbols[symbol] = address
+
+        # Splice references and words
+        old_refs = self._inc_refs
+        lo = bisect.bisect_left(old_refs, (rom_start, ""))
+        hi = bisect.bisect_left(old_refs, (rom_end, ""))
+        refs = old_refs[:lo]
+        refs += [(rom_start + index, symbol) for index, symbol in mid_refs]
+        if delta_rom:
+            refs += [(index + delta_rom, symbol)
+                     for index, symbol in old_refs[hi:]]
+        else:
+            refs += old_refs[hi:]
+
+        words = self._inc_words[:rom_start]
+        words += mid_words
+        words += self._inc_words[rom_end:]
+
+        # Resolve symbols in source order to keep RAM allocation order
+        variables: Dict[str, int] = {}
+        ram_address = self.ram_predefined
+        for index, symbol in refs:
+            if symbol not in symbols:
+                symbols[symbol] = ram_address
+                variables[symbol] = ram_address
+                ram_address += 1
+            words[index] = symbols[symbol]
+
+        line_words = self._inc_line_words[:head]
+        line_words += mid_line_words
+        line_words += self._inc_line_words[old_end:]
+
+        self._inc_lines = code
+        self._inc_line_words = line_words
+        self._inc_words = words
+        self._inc_labels = labels
+        self._inc_refs = refs
+
+        self._code = code
+        self._parser = None
+        self._symbols = symbols
+        self._variables = variables
+        self.symbol_table = {}
+        self._update_symbol_table(len(words))
+        return array.array("H", words)
+
+    def assemble_object(self) -> "assembler.ObjectModule":
+        """Assembles given code to relocatable object module.
+
+        References to own labels are relocated, pre-defined symbols are
+        resolved, and the other symbols are left to `Linker`.
+
+        Returns:
+            module (ObjectModule): Assembled module.
+        """
+
+        words, _, labels, refs = _assemble_chunk(self._lines())
+
+        module = assembler.ObjectModule(
+            words=words,
+            labels={symbol: address
+                    for symbol, (address, _) in labels.items()})
+        predefined = self._predefined_table()
+        for index, symbol in refs:
+            if symbol in module.labels:
+                words[index] = module.labels[symbol]
+                module.relocations.append(index)
+            elif symbol in predefined:
+                words[index] = predefined[symbol]
+            else:
+                module.references.append((index, symbol))
+
+        return module
+
+    def symbol_map(self) -> dict:
+        """Returns map of symbols of the last assembly.
+
+        Each label has its ROM address and the size of code up to the next
+        label at a higher address or the end of ROM; labels declared at the
+        same address share the span.
+
+        Returns:
+            symbol_map (dict): Dict of 'rom_size', 'labels' (list of dict with
+                'name', 'address' and 'size', sorted by address) and
+                'variables' (list of dict with 'name' and 'address').
+        """
+
+        predefined = self._predefined_table()
+        labels = sorted(
+            ((address, name) for name, address in self._symbols.items()
+             if name not in predefined and name not in self._variables),
+            key=lambda x: x[0])
+
+        label_list = []
+        end = self._rom_size
+        for address, name in reversed(labels):
+            if label_list and address < label_list[-1]["address"]:
+                end = label_list[-1]["address"]
+            label_list.append(
+                {"name": name, "address": address, "size": end - address})
+        label_list.reverse()
+
+        return {
+            "rom_size": self._rom_size,
+            "labels": label_list,
+            "variables": [{"name": name, "address": address}
+                          for name, address in self._variables.items()],
+        }
+
+    def source_map(self) -> "sourcemap.SourceMap":
+        """Returns map from ROM address to line of assemble code.
+
+        Returns:
+            source_map (SourceMap): Map with one step-1 run per block of
+                lines without labels or comments.
+        """
+
+        source_map = sourcemap.SourceMap()
+        rom_address = 0
+        for line, inst in enumerate(self._iter_instructions()):
+            if (inst.kind == assembler.Parser.a_command
+                    or inst.kind == assembler.Parser.c_command):
+                source_map.add(rom_address, line, step=1)
+                rom_address += 1
+
+        return source_map
+
+    def _single_pass(self) -> Iterator[int]:
+
+        self._symbols = self._predefined_table()
+
+        # Words from `flushed` and heap of first unresolved index of symbols
+        buffer: List[int] = []
+        flushed = 0
+        fixups: Dict[str, List[int]] = {}
+        first_refs: List[Tuple[int, str]] = []
+
+        rom_address = 0
+        for inst in self._iter_instructions():
+            if inst.kind == assembler.Parser.invalid:
+                continue
+            elif inst.kind == assembler.Parser.l_command:
+                symbol = inst.symbol
+                if symbol in self._symbols:
+                    raise ValueError(f"Duplicated label symbol: {symbol}.")
+                self._symbols[symbol] = rom_address
+
+                # Backpatch forward references
+                for index in fixups.pop(symbol, []):
+                    buffer[index - flushed] = rom_address
+                continue
+            elif inst.kind == assembler.Parser.c_command:
+                buffer.append(self._convert_c_cmd(inst))
+            else:
+                symbol = inst.symbol
+                if _is_number(symbol):
+                    buffer.append(int(symbol))
+                elif symbol in self._symbols:
+                    buffer.append(self._symbols[symbol])
+                else:
+                    if symbol not in fixups:
+                        fixups[symbol] = []
+                        heapq.heappush(first_refs, (rom_address, symbol))
+                    fixups[symbol].append(rom_address)
+                    buffer.append(0)
+            rom_address += 1
+
+            # Yield words preceding the first unresolved reference
+            while first_refs and first_refs[0][1] not in fixups:
+                heapq.heappop(first_refs)
+            pending = first_refs[0][0] if first_refs else rom_address
+            if pending > flushed:
+                yield from buffer[:pending - flushed]
+                del buffer[:pending - flushed]
+                flushed = pending
+
+        # Remaining symbols are variables
+        self._variables = {}
+        ram_address = self.ram_predefined
+        for symbol, indices in fixups.items():
+            self._symbols[symbol] = ram_address
+            self._variables[symbol] = ram_address
+            for index in indices:
+                buffer[index - flushed] = ram_address
+            ram_address += 1
+
+        yield from buffer
+
+    def _lines(self) -> List[str]:
+
+        if not isinstance(self._code, list):
+            self._code = list(self._code)
+        return self._code
+
+    def _iter_instructions(self) -> Iterator["assembler.Instruction"]:
 
-    def _create_symbol_table(self) -> None:
+        if self._parser is not None:
+            return iter(self._parser.instructions)
 
-        _symbol_table: Dict[str, int] = self.predefined_symbols.copy()
+        if hasattr(self._code, "seekable") and self._code.seekable():
+            self._code.seek(0)
+        return assembler.Parser.iter_parse(self._code)
+
+    @classmethod
+    def _predefined_table(cls) -> Dict[str, int]:
+
+        _symbol_table: Dict[str, int] = cls.predefined_symbols.copy()
 
         # Add pre-defined symbol in RAM
-        for n in range(self.ram_predefined):
+        for n in range(cls.ram_predefined):
             _symbol_table[f"R{n}"] = n
 
+        return _symbol_table
+
+    def _update_symbol_table(self, rom_size: int) -> None:
+
+        self._rom_size = rom_size
+
+        # Convert int -> bin string
+        for key, value in self._symbols.items():
+            self.symbol_table[key] = f"{value:015b}"
+
+    def _create_symbol_table(
+            self, instructions: Iterable["assembler.Instruction"]) -> None:
+
+        self._symbols = self._predefined_table()
+
         # Add label symbol with ROM address
         rom_address = 0
-        while True:
-            if self.parser.is_a_cmd() or self.parser.is_c_cmd():
+        for inst in instructions:
+            if (inst.kind == assembler.Parser.a_command
+                    or inst.kind == assembler.Parser.c_command):
                 rom_address += 1
-            elif self.parser.is_l_cmd():
-                symbol = self.parser.symbol()
-                if symbol not in _symbol_table:
-                    _symbol_table[symbol] = rom_address
+            elif inst.kind == assembler.Parser.l_command:
+                if inst.symbol not in self._symbols:
+                    self._symbols[inst.symbol] = rom_address
                 else:
-                    raise ValueError(f"Duplicated label symbol: {symbol}.")
+                    raise ValueError(
+                        f"Duplicated label symbol: {inst.symbol}.")
 
-            try:
-                self.parser.advance()
-            except RuntimeError:
-                break
+    def _convert_code(self, instructions: Iterable["assembler.Instruction"]
+                      ) -> Iterator[int]:
 
-        # Convert int -> bin string
-        for key, value in _symbol_table.items():
-            self.symbol_table[key] = f"{format(value, 'b'):0>15}"
+        self._variables = {}
+        ram_address = self.ram_predefined
+        for inst in instructions:
+            if inst.kind == assembler.Parser.c_command:
+                yield self._convert_c_cmd(inst)
+            elif inst.kind == assembler.Parser.a_command:
+                symbol = inst.symbol
+                if _is_number(symbol):
+                    yield int(symbol)
+                    continue
 
-    def _convert_code(self) -> List[str]:
+                if symbol not in self._symbols:
+                    self._symbols[symbol] = ram_address
+                    self._variables[symbol] = ram_address
+                    ram_address += 1
+                yield self._symbols[symbol]
 
-        self.parser.reset_index()
+    def _convert_c_cmd(self, inst: "assembler.Instruction") -> int:
 
-        res = []
-        ram_address = self.ram_predefined
-        while True:
-            binary = ""
-            if self.parser.is_invalid() or self.parser.is_l_cmd():
-                pass
-            elif self.parser.is_c_cmd():
-                binary += "111"
-                binary += "1" if "M" in self.parser.comp() else "0"
-                binary += self.converter.comp(self.parser.comp())
-                binary += self.converter.dest(self.parser.dest())
-                binary += self.converter.jump(self.parser.jump())
-            elif self.parser.is_a_cmd():
-                binary += "0"
-                symbol = self.parser.symbol()
-                if not all("0" <= c <= "9" for c in symbol):
-                    if symbol not in self.symbol_table:
-                        self.symbol_table[symbol] = (
-                            f"{format(ram_address, 'b'):0>15}")
-                        ram_address += 1
-                    symbol = self.symbol_table[symbol]
-                binary += symbol
-            else:
-                raise ValueError(
-                        f"Unknown command type {self.parser.command_type}.")
+        return self.converter.code_table[(inst.comp, inst.dest, inst.jump)]
 
-            if binary:
-                res.append(binary)
 
-            try:
-                self.parser.advance()
-            except RuntimeError:
-                break
+def _is_number(symbol: str) -> bool:
 
-        return res
+    return all("0" <= c <= "9" for c in symbol)
+
+
+def _assemble_chunk(code: List[str]) -> Tuple[
+        array.array, bytearray, Dict[str, Tuple[int, int]],
+        List[Tuple[int, str]]]:
+    """Parses and encodes chunk of code without resolving symbols.
+
+    Args:
+        code (list of str): Chunk of assemble code.
+
+    Returns:
+        words (array.array): Encoded chunk, symbolic A-commands left as 0.
+        line_words (bytearray): Number of words (0 or 1) of each line.
+        labels (dict of [str, (int, int)]): Label symbols with chunk-local
+            ROM address and line number.
+        refs (list of [int, str]): Index in `words` and symbol of symbolic
+            A-commands.
+    """
+
+    code_table = assembler.Converter.code_table
+    words = array.array("H")
+    line_words = bytearray(len(code))
+    labels: Dict[str, Tuple[int, int]] = {}
+    refs: List[Tuple[int, str]] = []
+    for n, line in enumerate(code):
+        inst = assembler.Parser.parse(line)
+        if inst.kind == assembler.Parser.c_command:
+            words.append(code_table[(inst.comp, inst.dest, inst.jump)])
+            line_words[n] = 1
+        elif inst.kind == assembler.Parser.a_command:
+            if _is_number(inst.symbol):
+                words.append(int(inst.symbol))
+            else:
+                refs.append((len(words), inst.symbol))
+                words.append(0)
+            line_words[n] = 1
+        elif inst.kind == assembler.Parser.l_command:
+            if inst.symbol in labels:
+                raise ValueError(f"Duplicated label symbol: {inst.symbol}.")
+            labels[inst.symbol] = (len(words), n)
+
+    return words, line_words, labels, refs
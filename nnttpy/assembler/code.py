@@ -1,3 +1,22 @@
+from typing import Dict, Sequence, Tuple, Union
+
+import array
+
+
+def _build_code_table(comp_table: Dict[str, str], dest_table: Dict[str, str],
+                      jump_table: Dict[str, str]
+                      ) -> Dict[Tuple[str, str, str], int]:
+
+    code_table = {}
+    for comp, comp_bin in comp_table.items():
+        a_bit = "1" if "M" in comp else "0"
+        for dest, dest_bin in dest_table.items():
+            for jump, jump_bin in jump_table.items():
+                code_table[(comp, dest, jump)] = int(
+                    "111" + a_bit + comp_bin + dest_bin + jump_bin, 2)
+
+    return code_table
+
 
 class Converter:
     """Convert all mnemonics to binary codes."""
@@ -55,6 +74,15 @@ class Converter:
         "JMP": "111",
     }
 
+    # All C-command words keyed on (comp, dest, jump)
+    code_table = _build_code_table(comp_table, dest_table, jump_table)
+
+    # Mnemonic indices for `encode_many`
+    comp_mnemonics = list(comp_table)
+    dest_mnemonics = list(dest_table)
+    jump_mnemonics = list(jump_table)
+    word_table = array.array("H", code_table.values())
+
     def comp(self, mnemonic: str) -> str:
         """Converts comp mnemonic to binary code.
 
@@ -90,3 +118,78 @@ class Converter:
         """
 
         return self.jump_table[mnemonic]
+
+    def encode(self, comp: str, dest: str, jump: str) -> int:
+        """Encodes C-command to 16-bit word.
+
+        Args:
+            comp (str): comp command.
+            dest (str): dest command.
+            jump (str): jump command.
+
+        Returns:
+            word (int): Encoded instruction.
+        """
+
+        return self.code_table[(comp, dest, jump)]
+
+    def encode_many(self, comp: Sequence[int], dest: Sequence[int],
+                    jump: Sequence[int]
+                    ) -> Union["numpy.ndarray", array.array]:
+        """Encodes C-commands given as mnemonic indices.
+
+        Indices refer to `comp_mnemonics`, `dest_mnemonics` and
+        `jump_mnemonics`. NumPy arrays are encoded in one vectorized lookup;
+        other sequences fall back to a plain loop.
+
+        Args:
+            comp (array-like of int): comp indices.
+            dest (array-like of int): dest indices.
+            jump (array-like of int): jump indices.
+
+        Returns:
+            words (numpy.ndarray or array.array): Encoded instructions of
+                16-bit unsigned int.
+
+        Raises:
+            ValueError: If given sequences have different lengths or an
+                index is out of range.
+        """
+
+        if not len(comp) == len(dest) == len(jump):
+            raise ValueError(
+                f"Length mismatch: comp={len(comp)}, dest={len(dest)}, "
+                f"jump={len(jump)}")
+
+        n_comp = len(self.comp_mnemonics)
+        n_dest = len(self.dest_mnemonics)
+        n_jump = len(self.jump_mnemonics)
+        try:
+            import numpy as np
+        except ImportError:
+            np = None
+
+        if np is not None and isinstance(comp, np.ndarray):
+            # Index math in intp, as small dtypes such as uint8 wrap
+            comp = np.asarray(comp, dtype=np.intp)
+            dest = np.asarray(dest, dtype=np.intp)
+            jump = np.asarray(jump, dtype=np.intp)
+            for name, indices, size in [("comp", comp, n_comp),
+                                        ("dest", dest, n_dest),
+                                        ("jump", jump, n_jump)]:
+                if indices.size and (indices.min() < 0
+                                     or indices.max() >= size):
+                    raise ValueError(f"Index out of range: {name}")
+
+            table = np.frombuffer(self.word_table, dtype=np.uint16)
+            return table[(comp * n_dest + dest) * n_jump + jump]
+
+        table = self.word_table
+        words = array.array("H")
+        for c, d, j in zip(comp, dest, jump):
+            if not (0 <= c < n_comp and 0 <= d < n_dest and 0 <= j < n_jump):
+                raise ValueError(
+                    f"Index out of range: comp={c}, dest={d}, jump={j}")
+            words.append(table[(c * n_dest + d) * n_jump + j])
+
+        return words
@@ -0,0 +1,98 @@
+from typing import Dict, Iterable, List, Optional
+
+from nnttpy import assembler
+
+
+def _build_text_table(code_table: Dict[tuple, int]) -> List[Optional[str]]:
+
+    # Index by lower 13 bits: a-bit, comp, dest and jump
+    text_table: List[Optional[str]] = [None] * 0x2000
+    for (comp, dest, jump), word in code_table.items():
+        text = comp
+        if dest != "null":
+            text = f"{dest}={text}"
+        if jump != "null":
+            text = f"{text};{jump}"
+        text_table[word & 0x1FFF] = text
+
+    return text_table
+
+
+class Disassembler:
+    """Convert binary codes to assemble code."""
+
+    text_table = _build_text_table(assembler.Converter.code_table)
+
+    def decode(self, word: int) -> str:
+        """Decodes single 16-bit word.
+
+        Args:
+            word (int): Machine code.
+
+        Returns:
+            code (str): Assemble code.
+
+        Raises:
+            ValueError: If `word` is not a valid C-command.
+        """
+
+        if word < 0x8000:
+            return f"@{word}"
+
+        text = self.text_table[word & 0x1FFF]
+        if text is None:
+            raise ValueError(f"Unknown instruction: {word:016b}")
+        return text
+
+    def disassemble(self, words: Iterable[int],
+                    labels: Optional[Dict[str, int]] = None) -> List[str]:
+        """Decodes machine code.
+
+        If `labels` is given, label declarations are inserted at their ROM
+        address and A-commands followed by a jump are replaced with the label
+        of the target address.
+
+        Args:
+            words (iterable of int): Machine code, e.g. `int(line, 2)` of each
+                line of .hack file.
+            labels (dict of [str, int], optional): Label symbols with ROM
+                address.
+
+        Returns:
+            code (list of str): Assemble code.
+
+        Raises:
+            ValueError: If a word is not a valid instruction.
+        """
+
+        words = list(words)
+        text_table = self.text_table
+        code = [f"@{w}" if w < 0x8000 else text_table[w & 0x1FFF]
+                for w in words]
+        if None in code:
+            index = code.index(None)
+            raise ValueError(
+                f"Unknown instruction at {index}: {words[index]:016b}")
+
+        if not labels:
+            return code
+
+        address_table: Dict[int, List[str]] = {}
+        for symbol, address in labels.items():
+            address_table.setdefault(address, []).append(symbol)
+
+        # Jump targets: A-command followed by C-command with jump bits
+        for n in range(len(words) - 1):
+            if (words[n] < 0x8000 and words[n] in address_table
+                    and words[n + 1] >= 0x8000 and words[n + 1] & 0x7):
+                code[n] = f"@{address_table[words[n]][0]}"
+
+        res = []
+        for n, line in enumerate(code):
+            for symbol in address_table.get(n, []):
+                res.append(f"({symbol})")
+            res.append(line)
+        for symbol in address_table.get(len(code), []):
+            res.append(f"({symbol})")
+
+        return res
@@ -0,0 +1,129 @@
+"""Relocatable object module and linker of Hack machine code."""
+
+from typing import Dict, List, Tuple, Union
+
+import array
+import dataclasses
+import json
+import pathlib
+
+from nnttpy import assembler
+
+
+@dataclasses.dataclass
+class ObjectModule:
+    """Separately assembled code.
+
+    Attributes:
+        words (array.array): Machine code of typecode 'H'. Words referring to
+            own labels hold module-relative addresses, and words referring to
+            other symbols hold 0.
+        labels (dict of [str, int]): Exported label symbols with
+            module-relative ROM address.
+        relocations (list of int): Indices of words holding module-relative
+            addresses.
+        references (list of [int, str]): Indices and symbols of words which
+            are resolved at link time, either labels of other modules or
+            variables.
+    """
+
+    words: array.array = dataclasses.field(
+        default_factory=lambda: array.array("H"))
+    labels: Dict[str, int] = dataclasses.field(default_factory=dict)
+    relocations: List[int] = dataclasses.field(default_factory=list)
+    references: List[Tuple[int, str]] = dataclasses.field(
+        default_factory=list)
+
+    def save(self, path: Union[str, pathlib.Path]) -> None:
+        """Saves module in JSON.
+
+        Args:
+            path (str or pathlib.Path): Path to output file.
+        """
+
+        data = {
+            "words": self.words.tolist(),
+            "labels": self.labels,
+            "relocations": self.relocations,
+            "references": self.references,
+        }
+        with pathlib.Path(path).open("w") as f:
+            json.dump(data, f)
+
+    @classmethod
+    def load(cls, path: Union[str, pathlib.Path]) -> "ObjectModule":
+        """Loads module saved by `save`.
+
+        Args:
+            path (str or pathlib.Path): Path to object file.
+
+        Returns:
+            module (ObjectModule): Loaded module.
+        """
+
+        with pathlib.Path(path).open("r") as f:
+            data = json.load(f)
+
+        return cls(
+            words=array.array("H", data["words"]),
+            labels=data["labels"],
+            relocations=data["relocations"],
+            references=[(index, symbol)
+                        for index, symbol in data["references"]],
+        )
+
+
+class Linker:
+    """Linker of object modules into ROM."""
+
+    def __init__(self):
+
+        self.symbols: Dict[str, int] = {}
+        self.variables: Dict[str, int] = {}
+
+    def link(self, modules: List[ObjectModule]) -> array.array:
+        """Links modules in given order.
+
+        Output is identical to assembling the concatenated source code. Time
+        is linear in the number of words, relocations and references.
+
+        Args:
+            modules (list of ObjectModule): Modules to be linked.
+
+        Returns:
+            words (array.array): Machine code of typecode 'H'.
+
+        Raises:
+            ValueError: If a label is exported by multiple modules.
+        """
+
+        # Place modules and merge exported labels
+        symbols = assembler.Assembler._predefined_table()
+        bases = []
+        base = 0
+        for module in modules:
+            bases.append(base)
+            for symbol, address in module.labels.items():
+                if symbol in symbols:
+                    raise ValueError(f"Duplicated label symbol: {symbol}.")
+                symbols[symbol] = base + address
+            base += len(module.words)
+
+        res = array.array("H")
+        variables: Dict[str, int] = {}
+        ram_address = assembler.Assembler.ram_predefined
+        for module, base in zip(modules, bases):
+            words = array.array("H", module.words)
+            for index in module.relocations:
+                words[index] += base
+            for index, symbol in module.references:
+                if symbol not in symbols:
+                    symbols[symbol] = ram_address
+                    variables[symbol] = ram_address
+                    ram_address += 1
+                words[index] = symbols[symbol]
+            res.extend(words)
+
+        self.symbols = symbols
+        self.variables = variables
+        return res
@@ -0,0 +1,134 @@
+"""Peephole optimizer of Hack assemble code.
+
+ref)
+https://en.wikipedia.org/wiki/Peephole_optimization
+"""
+
+from typing import Dict, Iterable, List, Optional
+
+import dataclasses
+import re
+
+
+@dataclasses.dataclass
+class PeepholeRule:
+    """Rewriting rule of consecutive commands.
+
+    `pattern` is a list of regular expressions, one per command, matched
+    against the window of the latest commands. Groups may be referred to by
+    later lines of the pattern and by `replace` (e.g. `\\g<x>`). Empty
+    replacement lines are dropped.
+    """
+
+    name: str = ""
+    pattern: List[str] = dataclasses.field(default_factory=list)
+    replace: List[str] = dataclasses.field(default_factory=list)
+
+    def __post_init__(self):
+
+        if len(self.replace) >= len(self.pattern):
+            raise ValueError(
+                f"Rule '{self.name}' must shorten code to terminate.")
+
+        self._regex = re.compile("\n".join(self.pattern))
+        self._template = "\n".join(self.replace)
+
+    @property
+    def size(self) -> int:
+        return len(self.pattern)
+
+    def apply(self, window: List[str]) -> Optional[List[str]]:
+        """Rewrites window if it matches the pattern.
+
+        Args:
+            window (list of str): Commands of length `size`.
+
+        Returns:
+            replaced (list of str or None): Rewritten commands, `None` if not
+                matched.
+        """
+
+        match = self._regex.fullmatch("\n".join(window))
+        if match is None:
+            return None
+
+        return [line for line in match.expand(self._template).split("\n")
+                if line]
+
+
+class PeepholeOptimizer:
+    """Peephole optimizer running on assemble code before `Assembler`.
+
+    Jumps are assumed to target labels only, so that any window without
+    label declaration is a straight-line code.
+    """
+
+    # Rules valid for any code
+    default_rules = [
+        # A register is overwritten before use
+        PeepholeRule("dead_a_load", [r"@\S+", r"(?P<a>@\S+)"], [r"\g<a>"]),
+        # Increment and decrement of the same memory
+        PeepholeRule("inc_dec", [r"M=M\+1", r"M=M-1"], []),
+        PeepholeRule("dec_inc", [r"M=M-1", r"M=M\+1"], []),
+        # A register still holds the address
+        PeepholeRule("redundant_reload",
+                     [r"@(?P<x>\S+)", r"(?P<c>(?:M|D|MD)=[^;]+)", r"@(?P=x)"],
+                     [r"@\g<x>", r"\g<c>"]),
+        # D register already equals the stored value
+        PeepholeRule("store_reload", [r"(?P<c>(?:M|MD)=D)", r"D=M"],
+                     [r"\g<c>"]),
+        # Constant 0 or 1 does not need A register
+        PeepholeRule("small_constant",
+                     [r"@(?P<k>[01])", r"D=A", r"(?P<a>@\S+)"],
+                     [r"D=\g<k>", r"\g<a>"]),
+    ]
+
+    # Rules assuming that a pointer does not point to itself, which holds for
+    # SP, LCL, ARG, THIS and THAT of VM translated code
+    stack_rules = [
+        PeepholeRule("pointer_reload",
+                     [r"@(?P<x>\S+)", r"A=M", r"M=D", r"@(?P=x)", r"A=M"],
+                     [r"@\g<x>", r"A=M", r"M=D"]),
+    ]
+
+    def __init__(self, rules: Optional[List[PeepholeRule]] = None):
+
+        self.rules = self.default_rules if rules is None else rules
+        self.hits: Dict[str, int] = {rule.name: 0 for rule in self.rules}
+
+    def optimize(self, code: Iterable[str]) -> List[str]:
+        """Optimizes given code.
+
+        Comments and empty lines are removed. Each command is appended to the
+        output and the rules are tried on the latest commands; rewritten
+        commands are appended again one by one, so that they are optimized
+        again.
+
+        Args:
+            code (iterable of str): Assemble code.
+
+        Returns:
+            optimized (list of str): Optimized assemble code.
+        """
+
+        res: List[str] = []
+        for line in code:
+            line = line.split("//")[0].replace(" ", "").strip()
+            if not line:
+                continue
+
+            pending = [line]
+            while pending:
+                res.append(pending.pop())
+                for rule in self.rules:
+                    if len(res) < rule.size:
+                        continue
+
+                    replaced = rule.apply(res[-rule.size:])
+                    if replaced is not None:
+                        del res[-rule.size:]
+                        pending += reversed(replaced)
+                        self.hits[rule.name] += 1
+                        break
+
+        return res
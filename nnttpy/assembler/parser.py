@@ -1,5 +1,47 @@
 
-from typing import List
+from typing import Iterable, Iterator, List
+
+
+class Instruction:
+    """Parsed assemble command.
+
+    Attributes:
+        kind (int): Command type, see `Parser`.
+        comp (str): comp mnemonic of C-command.
+        dest (str): dest mnemonic of C-command.
+        jump (str): jump mnemonic of C-command.
+        symbol (str): Symbol of A-command or L-command, without '@' or '()'.
+    """
+
+    __slots__ = ("kind", "comp", "dest", "jump", "symbol")
+
+    def __init__(self, kind: int = 0, comp: str = "", dest: str = "null",
+                 jump: str = "null", symbol: str = ""):
+
+        self.kind = kind
+        self.comp = comp
+        self.dest = dest
+        self.jump = jump
+        self.symbol = symbol
+
+    def __repr__(self) -> str:
+
+        return (f"Instruction(kind={self.kind}, comp={self.comp!r}, "
+                f"dest={self.dest!r}, jump={self.jump!r}, "
+                f"symbol={self.symbol!r})")
+
+    def __eq__(self, other: object) -> bool:
+
+        if not isinstance(other, Instruction):
+            return NotImplemented
+
+        return (self.kind == other.kind and self.comp == other.comp
+                and self.dest == other.dest and self.jump == other.jump
+                and self.symbol == other.symbol)
+
+    def __hash__(self) -> int:
+
+        return hash((self.kind, self.comp, self.dest, self.jump, self.symbol))
 
 
 class Parser:
@@ -19,16 +61,77 @@ class Parser:
     dest_cand = set(["M", "D", "MD", "A", "AM", "AD", "AMD"])
     jump_cand = set(["JGT", "JEQ", "JGE", "JLT", "JNE", "JLE", "JMP"])
 
-    def __init__(self, code: List[str]):
+    def __init__(self, code: Iterable[str]):
 
-        self._code = code
-        self._length = len(code)
+        self._instructions = [self.parse(line) for line in code]
+        self._length = len(self._instructions)
         self._index = 0
-        self._current = ""
+        self._current = Instruction()
 
         # Set first command
         self.advance()
 
+    @classmethod
+    def parse(cls, line: str) -> Instruction:
+        """Parses single line of code.
+
+        Args:
+            line (str): Line of assemble code.
+
+        Returns:
+            instruction (Instruction): Parsed command.
+
+        Raises:
+            ValueError: If parsed comp, dest or jump command is not one of the
+                expected.
+        """
+
+        # Remove comments
+        # ex) "D=A  // comment" -> "D=A"
+        line = line.split("//")[0].strip()
+
+        if not line:
+            return Instruction()
+        elif line[0] == "@":
+            return Instruction(cls.a_command, symbol=line[1:])
+        elif line[0] == "(" and line[-1] == ")":
+            return Instruction(cls.l_command, symbol=line[1:-1])
+
+        dest, _, rest = line.rpartition("=")
+        comp, _, jump = rest.partition(";")
+        dest = dest.strip() or "null"
+        comp = comp.strip()
+        jump = jump.strip() or "null"
+
+        if comp not in cls.comp_cand:
+            raise ValueError(f"Unknown comp command '{comp}'.")
+        if dest != "null" and dest not in cls.dest_cand:
+            raise ValueError(f"Unknown dest command '{dest}'.")
+        if jump != "null" and jump not in cls.jump_cand:
+            raise ValueError(f"Unknown jump command '{jump}'.")
+
+        return Instruction(cls.c_command, comp, dest, jump)
+
+    @classmethod
+    def iter_parse(cls, code: Iterable[str]) -> Iterator[Instruction]:
+        """Parses lines lazily.
+
+        Args:
+            code (iterable of str): Assemble code, e.g. an open file.
+
+        Yields:
+            instruction (Instruction): Parsed command.
+        """
+
+        for line in code:
+            yield cls.parse(line)
+
+    @property
+    def instructions(self) -> List[Instruction]:
+        """Parsed commands, one per line of the given code."""
+
+        return self._instructions
+
     def has_more_commands(self) -> bool:
         """Check whether command exists in input.
 
@@ -48,9 +151,7 @@ class Parser:
         if not self.has_more_commands():
             raise RuntimeError("No successive command exists.")
 
-        # Remove comments
-        # ex) "D=A  // comment" -> "D=A"
-        self._current = self._code[self._index].split("//")[0].strip()
+        self._current = self._instructions[self._index]
         self._index += 1
 
     def reset_index(self) -> None:
@@ -68,29 +169,23 @@ class Parser:
                 Location = 3.
         """
 
-        if not self._current:
-            return self.invalid
-        elif self._current[0] == "@":
-            return self.a_command
-        elif self._current[0] == "(" and self._current[-1] == ")":
-            return self.l_command
-        return self.c_command
+        return self._current.kind
 
     def is_invalid(self) -> bool:
         """Checks command type."""
-        return self.command_type == self.invalid
+        return self._current.kind == self.invalid
 
     def is_a_cmd(self) -> bool:
         """Checks command type."""
-        return self.command_type == self.a_command
+        return self._current.kind == self.a_command
 
     def is_l_cmd(self) -> bool:
         """Checks command type."""
-        return self.command_type == self.l_command
+        return self._current.kind == self.l_command
 
     def is_c_cmd(self) -> bool:
         """Checks command type."""
-        return self.command_type == self.c_command
+        return self._current.kind == self.c_command
 
     def symbol(self) -> str:
         """Get symbol.
@@ -107,7 +202,7 @@ class Parser:
                 and self.command_type != self.l_command):
             raise AttributeError(f"Invalid command type: {self.command_type}")
 
-        symbol = self._current.strip("@()")
+        symbol = self._current.symbol
         if all("0" <= c <= "9" for c in symbol):
             symbol = f"{format(int(symbol), 'b'):0>15}"
 
@@ -121,16 +216,12 @@ class Parser:
 
         Raises:
             AttributeError: If `command_type` is not `c_command`.
-            ValueError: If parsed comp command is not one of the expected.
         """
 
         if self.command_type != self.c_command:
             raise AttributeError(f"Invalid command type: {self.command_type}")
 
-        comp = self._current.split("=")[-1].split(";")[0].strip()
-        if comp not in self.comp_cand:
-            raise ValueError(f"Unknown comp command '{comp}'.")
-        return comp
+        return self._current.comp
 
     def dest(self) -> str:
         """Returns dest mnemonic.
@@ -140,20 +231,12 @@ class Parser:
 
         Raises:
             AttributeError: If `command_type` is not `c_command`.
-            ValueError: If parsed dest command is not one of the expected.
         """
 
         if self.command_type != self.c_command:
             raise AttributeError(f"Invalid command type: {self.command_type}")
 
-        if "=" not in self._current:
-            return "null"
-
-        dest = self._current.split("=")[0].strip()
-        if dest not in self.dest_cand:
-            raise ValueError(f"Unknown dest command '{dest}'.")
-
-        return dest
+        return self._current.dest
 
     def jump(self) -> str:
         """Returns jump mnemonic.
@@ -163,17 +246,9 @@ class Parser:
 
         Raises:
             AttributeError: If `command_type` is not `c_command`.
-            ValueError: If parsed jump command is not one of the expected.
         """
 
         if self.command_type != self.c_command:
             raise AttributeError(f"Invalid command type: {self.command_type}")
 
-        if ";" not in self._current:
-            return "null"
-
-        jump = self._current.split(";")[1].strip()
-        if jump not in self.jump_cand:
-            raise ValueError(f"Unknown jump command '{jump}'.")
-
-        return jump
+        return self._current.jump
@@ -0,0 +1,117 @@
+"""Writers of assembled 16-bit words.
+
+ref)
+https://numpy.org/doc/stable/reference/generated/numpy.lib.format.html
+"""
+
+from typing import Iterable, Union
+
+import array
+import json
+import pathlib
+import sys
+
+
+def write_hack(words: Iterable[int], path: Union[str, pathlib.Path]) -> None:
+    """Writes words in text .hack format, one 16-char binary per line.
+
+    Words are written as they are produced, so `words` may be a generator
+    such as `Assembler.iter_words()`.
+
+    Args:
+        words (iterable of int): Machine code.
+        path (str or pathlib.Path): Path to output file.
+    """
+
+    with pathlib.Path(path).open("w") as f:
+        for n, word in enumerate(words):
+            f.write(f"\n{word:016b}" if n else f"{word:016b}")
+
+
+def write_binary(words: Iterable[int], path: Union[str, pathlib.Path],
+                 byteorder: str = "little") -> None:
+    """Writes words as raw 16-bit binary.
+
+    Args:
+        words (iterable of int): Machine code.
+        path (str or pathlib.Path): Path to output file.
+        byteorder (str, optional): 'little' or 'big'.
+
+    Raises:
+        ValueError: If `byteorder` is unknown.
+    """
+
+    if byteorder not in ["little", "big"]:
+        raise ValueError(f"Unknown byteorder: {byteorder}")
+
+    with pathlib.Path(path).open("wb") as f:
+        f.write(_to_bytes(words, byteorder))
+
+
+def write_npy(words: Iterable[int], path: Union[str, pathlib.Path]) -> None:
+    """Writes words as 1-d '<u2' array in NumPy .npy format (version 1.0).
+
+    Args:
+        words (iterable of int): Machine code.
+        path (str or pathlib.Path): Path to output file.
+    """
+
+    data = _to_bytes(words, "little")
+    header = ("{'descr': '<u2', 'fortran_order': False, "
+              f"'shape': ({len(data) // 2},), }}")
+
+    # Magic (6) + version (2) + header length (2) + header is aligned to 64
+    padding = -(10 + len(header) + 1) % 64
+    header += " " * padding + "\n"
+
+    with pathlib.Path(path).open("wb") as f:
+        f.write(b"\x93NUMPY\x01\x00")
+        f.write(len(header).to_bytes(2, "little"))
+        f.write(header.encode("latin1"))
+        f.write(data)
+
+
+def write_map_json(symbol_map: dict, path: Union[str, pathlib.Path]) -> None:
+    """Writes symbol map in JSON.
+
+    Args:
+        symbol_map (dict): Returned value of `Assembler.symbol_map`.
+        path (str or pathlib.Path): Path to output file.
+    """
+
+    with pathlib.Path(path).open("w") as f:
+        json.dump(symbol_map, f, indent=2)
+
+
+def write_map_text(symbol_map: dict, path: Union[str, pathlib.Path]) -> None:
+    """Writes symbol map as text tables of ROM labels and RAM variables.
+
+    Args:
+        symbol_map (dict): Returned value of `Assembler.symbol_map`.
+        path (str or pathlib.Path): Path to output file.
+    """
+
+    lines = [f"ROM size: {symbol_map['rom_size']}", "",
+             "address   size  label"]
+    for label in symbol_map["labels"]:
+        lines.append(
+            f"{label['address']:>7}  {label['size']:>5}  {label['name']}")
+
+    lines += ["", "address  variable"]
+    for variable in symbol_map["variables"]:
+        lines.append(f"{variable['address']:>7}  {variable['name']}")
+
+    with pathlib.Path(path).open("w") as f:
+        f.write("\n".join(lines) + "\n")
+
+
+def _to_bytes(words: Iterable[int], byteorder: str) -> bytes:
+
+    swap = byteorder != sys.byteorder
+    if swap or not isinstance(words, array.array) or words.typecode != "H":
+        words = array.array("H", words)
+
+    if swap:
+        words.byteswap()
+
+    return words.tobytes()
@@ -3,7 +3,7 @@ from typing import Union, List, Tuple
 
 import pathlib
 
-from nnttpy import jackcompiler
+from nnttpy import jackcompiler, sourcemap
 
 
 class JackAnalyzer:
@@ -14,6 +14,7 @@ class JackAnalyzer:
         self._tokenizer = jackcompiler.JackTokenizer()
         self._xml_engine = jackcompiler.XMLCompilationEngine()
         self._engine = jackcompiler.JackCompileEngine()
+        self._source_map = sourcemap.SourceMap()
 
     def compile_xml(self, path: Union[str, pathlib.Path]) -> List[str]:
         """Compiles Jack lang code to XML.
@@ -48,9 +49,16 @@ class JackAnalyzer:
             vm_code = self._engine.compile(token_list)
         except SyntaxError as e:
             raise SyntaxError(f"{e.msg} in {path}.") from e
+        self._source_map = self._engine.writer.source_map(str(path))
 
         return vm_code
 
+    @property
+    def source_map(self) -> "sourcemap.SourceMap":
+        """Map from VM line to Jack file and line of the last `compile`."""
+
+        return self._source_map
+
     def _tokenize_code(self, path: Union[str, pathlib.Path]
                        ) -> List[Tuple[int, str]]:
         """Tokenizes given jack file to Tokens.
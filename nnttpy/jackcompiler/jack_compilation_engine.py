@@ -1,5 +1,5 @@
 
-from typing import List, Tuple
+from typing import List, Tuple, Union
 
 from nnttpy import jackcompiler
 
@@ -43,10 +43,17 @@ class JackCompileEngine(jackcompiler.XMLCompilationEngine):
             code_list (list of str): Compiled codes.
         """
 
+        self._writer = jackcompiler.VMWriter()
         super().compile(token_list)
 
         return self._writer.code[:]
 
+    @property
+    def writer(self) -> "jackcompiler.VMWriter":
+        """VM writer of the last compilation."""
+
+        return self._writer
+
     def compile_class(self) -> None:
         """Compiles class.
 
@@ -386,3 +393,22 @@ class JackCompileEngine(jackcompiler.XMLCompilationEngine):
         self._write_non_terminal_tag("/expressionList")
 
         return num_args
+
+    def _write_checked_token(self, tag: str,
+                             content: Union[str, List[str]] = "") -> str:
+
+        content = super()._write_checked_token(tag, content)
+        self._writer.source_line = self._line_list[self._index - 1]
+        return content
+
+    def _write_checked_type(self, allow_void: bool = False) -> str:
+
+        content = super()._write_checked_type(allow_void)
+        self._writer.source_line = self._line_list[self._index - 1]
+        return content
+
+    def _write_checked_ops(self) -> str:
+
+        content = super()._write_checked_ops()
+        self._writer.source_line = self._line_list[self._index - 1]
+        return content
@@ -1,6 +1,8 @@
 
 from typing import List
 
+from nnttpy import sourcemap
+
 
 class VMWriter:
     """VM writer in compilation."""
@@ -13,10 +15,28 @@ class VMWriter:
 
         self._code: List[str] = []
 
+        # 1-based Jack line of each VM command, set by compilation engine
+        self.source_line = 0
+        self._source_lines: List[int] = []
+
     @property
     def code(self) -> List[str]:
         return self._code
 
+    def source_map(self, file_name: str = "") -> "sourcemap.SourceMap":
+        """Returns map from VM line to Jack line.
+
+        Args:
+            file_name (str, optional): Name of Jack file.
+
+        Returns:
+            source_map (SourceMap): Map of written code.
+        """
+
+        # Tokenizer lines are 1-based, and source maps are 0-based
+        return sourcemap.SourceMap.from_lines(
+            [line - 1 for line in self._source_lines], file_name)
+
     def write_push(self, segment: str, index: int) -> None:
         """Writes push methods `push segment index`.
 
@@ -31,7 +51,7 @@ class VMWriter:
         if segment not in self.memory_segment:
             raise ValueError(f"Unexpected segment: {segment}")
 
-        self._code.append(f"push {segment} {index}")
+        self._append(f"push {segment} {index}")
 
     def write_pop(self, segment: str, index: int) -> None:
         """Writes pop methods `pop segment index`.
@@ -47,7 +67,7 @@ class VMWriter:
         if segment not in self.memory_segment:
             raise ValueError(f"Unexpected segment: {segment}")
 
-        self._code.append(f"pop {segment} {index}")
+        self._append(f"pop {segment} {index}")
 
     def write_arithmetic(self, command: str) -> None:
         """Writes arithmetic command.
@@ -62,7 +82,7 @@ class VMWriter:
         if command not in self.op_commands:
             raise ValueError(f"Unexpected command: {command}")
 
-        self._code.append(f"{command}")
+        self._append(f"{command}")
 
     def write_label(self, label: str) -> None:
         """Writes label command `label 'label'`.
@@ -71,7 +91,7 @@ class VMWriter:
             label (str): Label of code.
         """
 
-        self._code.append(f"label {label}")
+        self._append(f"label {label}")
 
     def write_goto(self, label: str) -> None:
         """Writes goto command `goto 'label'`.
@@ -80,7 +100,7 @@ class VMWriter:
             label (str): Label of code.
         """
 
-        self._code.append(f"goto {label}")
+        self._append(f"goto {label}")
 
     def write_if(self, label: str) -> None:
         """Writes if-goto command `if-goto 'label'`.
@@ -89,7 +109,7 @@ class VMWriter:
             label (str): Label of code.
         """
 
-        self._code.append(f"if-goto {label}")
+        self._append(f"if-goto {label}")
 
     def write_call(self, name: str, n_args: int) -> None:
         """Writes function call `call 'name' 'a_args'`.
@@ -99,7 +119,7 @@ class VMWriter:
             n_args (int): Number of arguments.
         """
 
-        self._code.append(f"call {name} {n_args}")
+        self._append(f"call {name} {n_args}")
 
     def write_function(self, name: str, n_locals: int) -> None:
         """Writes function statements `function 'name' 'n_locals'`.
@@ -109,9 +129,14 @@ class VMWriter:
             n_locals (int): Number of local variables.
         """
 
-        self._code.append(f"call {name} {n_locals}")
+        self._append(f"call {name} {n_locals}")
 
     def write_return(self) -> None:
         """Writes return commands `return`."""
 
-        self._code.append("return")
+        self._append("return")
+
+    def _append(self, command: str) -> None:
+
+        self._code.append(command)
+        self._source_lines.append(self.source_line)
@@ -0,0 +1,211 @@
+
+"""Source maps between compilation stages.
+
+Each stage maps positions of its output (VM lines, assemble code lines or ROM
+addresses) to positions of its input. Maps are stored as runs, so that
+lookup is a binary search, and `SourceMapChain` composes them to answer
+e.g. which Jack line produced ROM[n].
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple, Union
+
+import array
+import bisect
+
+
+class SourceMap:
+    """Run-length map from output positions to (file, line) of input.
+
+    A run starts at `starts[i]` and ends at the next start or `length`. In a
+    run with step 0 all positions map to the same line, and with step 1
+    lines increase with positions. Line -1 marks positions without source
+    (e.g. bootstrap code).
+
+    Positions and lines of every stage are 0-based, so a looked up line is
+    the output position of the previous stage, e.g. line 0 is the first
+    line of a Jack file and ROM[0] is address 0.
+
+    Attributes:
+        files (list of str): Source file names.
+        length (int): Number of mapped output positions.
+    """
+
+    def __init__(self):
+
+        self.files: List[str] = []
+        self.length = 0
+        self._file_table: Dict[str, int] = {}
+        self._starts = array.array("l")
+        self._file_ids = array.array("l")
+        self._lines = array.array("l")
+        self._steps = array.array("b")
+
+    def __len__(self) -> int:
+        return len(self._starts)
+
+    def add(self, target: int, line: int, file_name: str = "",
+            step: int = 0) -> None:
+        """Maps output positions from `target` to source line.
+
+        Targets must be given in increasing order. Consecutive calls which
+        continue the last run are merged into it.
+
+        Args:
+            target (int): Output position.
+            line (int): Source line, -1 for no source.
+            file_name (str, optional): Source file.
+            step (int, optional): 0 if following positions map to the same
+                line, 1 if they map to following lines.
+        """
+
+        file_id = self._file_table.get(file_name)
+        if file_id is None:
+            file_id = self._file_table[file_name] = len(self.files)
+            self.files.append(file_name)
+
+        if self._starts and self._file_ids[-1] == file_id:
+            last_step = self._steps[-1]
+            distance = target - self._starts[-1]
+            expected = self._lines[-1] + last_step * distance
+            if last_step == step and expected == line:
+                self.length = max(self.length, target + 1)
+                return
+
+        self._starts.append(target)
+        self._file_ids.append(file_id)
+        self._lines.append(line)
+        self._steps.append(step)
+        self.length = max(self.length, target + 1)
+
+    def merge(self, other: "SourceMap", offset: int) -> None:
+        """Appends runs of another map shifted by `offset`.
+
+        Args:
+            other (SourceMap): Map of later output positions.
+            offset (int): Value added to output positions of `other`.
+        """
+
+        for start, file_id, line, step in zip(
+                other._starts, other._file_ids, other._lines, other._steps):
+            self.add(start + offset, line, other.files[file_id], step)
+        self.length = max(self.length, other.length + offset)
+
+    def lookup(self, target: int) -> Optional[Tuple[str, int]]:
+        """Finds source of output position in O(log n).
+
+        Args:
+            target (int): Output position.
+
+        Returns:
+            source (tuple or None): File name and line, `None` if unmapped.
+        """
+
+        if target < 0 or target >= self.length:
+            return None
+
+        n = bisect.bisect_right(self._starts, target) - 1
+        if n < 0 or self._lines[n] < 0:
+            return None
+
+        line = self._lines[n] + self._steps[n] * (target - self._starts[n])
+        return self.files[self._file_ids[n]], line
+
+    @classmethod
+    def from_lines(cls, lines: Sequence[int], file_name: str = ""
+                   ) -> "SourceMap":
+        """Makes map from source line of each output position.
+
+        Args:
+            lines (sequence of int): Source line per output position.
+            file_name (str, optional): Source file.
+
+        Returns:
+            source_map (SourceMap): Compressed map.
+        """
+
+        source_map = cls()
+        for target, line in enumerate(lines):
+            source_map.add(target, line, file_name)
+        source_map.length = len(lines)
+
+        return source_map
+
+    def to_dict(self) -> dict:
+        """Returns map as JSON serializable dict."""
+
+        return {
+            "files": self.files,
+            "length": self.length,
+            "starts": self._starts.tolist(),
+            "file_ids": self._file_ids.tolist(),
+            "lines": self._lines.tolist(),
+            "steps": self._steps.tolist(),
+        }
+
+    @classmethod
+    def from_dict(cls, data: dict) -> "SourceMap":
+        """Loads map from `to_dict` output.
+
+        Args:
+            data (dict): Dict of map.
+
+        Returns:
+            source_map (SourceMap): Loaded map.
+        """
+
+        source_map = cls()
+        source_map.files = list(data["files"])
+        source_map._file_table = {
+            name: n for n, name in enumerate(source_map.files)}
+        source_map.length = data["length"]
+        source_map._starts = array.array("l", data["starts"])
+        source_map._file_ids = array.array("l", data["file_ids"])
+        source_map._lines = array.array("l", data["lines"])
+        source_map._steps = array.array("b", data["steps"])
+
+        return source_map
+
+
+class SourceMapChain:
+    """Composition of source maps from the last stage to the first.
+
+    Each stage is a `SourceMap`, or a dict from file name to `SourceMap`
+    when the previous stage produced multiple files. For example, ROM
+    address to Jack line is given by
+
+        SourceMapChain([assembler_map, translator_map,
+                        {"MAIN": main_jack_map, ...}])
+
+    where dict keys are VM file names as in `VMCodeWriter.file_name`.
+    """
+
+    def __init__(self, stages: List[Union[SourceMap, Dict[str, SourceMap]]]):
+
+        self.stages = stages
+
+    def lookup(self, target: int) -> Optional[Tuple[str, int]]:
+        """Finds source of output position of the last stage.
+
+        Each stage is a binary search, so the query is O(log n).
+
+        Args:
+            target (int): Output position, e.g. ROM address.
+
+        Returns:
+            source (tuple or None): File name and line of the first stage,
+                `None` if any stage is unmapped.
+        """
+
+        file_name = ""
+        for stage in self.stages:
+            source_map = (stage.get(file_name) if isinstance(stage, dict)
+                          else stage)
+            if source_map is None:
+                return None
+
+            source = source_map.lookup(target)
+            if source is None:
+                return None
+            file_name, target = source
+
+        return file_name, target
@@ -1,4 +1,8 @@
 
 from .code_writer import VMCodeWriter
+from .interpreter import VMInterpreter
+from .optimizer import ConstantFolder, DeadFunctionEliminator, Inliner
+from .report import CostReport
 from .translator import VMTranslator
-from .vmparser import VMParser
+from .vmparser import (Opcode, Segment, VMInstruction, VMParser, opcode_names,
+                       segment_names)
@@ -1,5 +1,7 @@
 
-from typing import List
+from typing import List, Optional
+
+from nnttpy import sourcemap, vmtranslator
 
 
 class VMCodeWriter:
@@ -27,16 +29,81 @@ class VMCodeWriter:
         "pointer": "THIS",
         "temp": "5",
     }
+    # Segments at fixed addresses
+    direct_base = {"pointer": 3, "temp": 5}
+
+    compare_jump = {"eq": "JEQ", "gt": "JGT", "lt": "JLT"}
+    compare_modes = ["inline", "shared", "auto"]
+
+    # Shared routines emitted by `write_init` when `shared_calls` is set
+    # __CALL: R13 = function, R14 = number of args, D = return address
+    call_routine = (
+        ["(__CALL)", "@SP", "A=M", "M=D"]
+        + sum([[f"@{register}", "D=M", "@SP", "AM=M+1", "M=D"]
+               for register in ["LCL", "ARG", "THIS", "THAT"]], [])
+        + ["@SP", "MD=M+1", "@LCL", "M=D", "@14", "D=D-M", "@5", "D=D-A",
+           "@ARG", "M=D", "@13", "A=M", "0;JMP"])
+    # __RETURN: return value on the stack, __RETURN_D: return value in D
+    return_routine = (
+        ["(__RETURN)", "@SP", "AM=M-1", "D=M", "(__RETURN_D)", "@13", "M=D",
+         "@5", "D=A", "@LCL", "A=M-D", "D=M", "@15", "M=D", "@13", "D=M",
+         "@ARG", "A=M", "M=D", "D=A+1", "@SP", "M=D"]
+        + sum([["@LCL", "AM=M-1", "D=M", f"@{register}", "M=D"]
+               for register in ["THAT", "THIS", "ARG", "LCL"]], [])
+        + ["@15", "A=M", "0;JMP"])
+    # __ZERO_LOCALS: D = number of locals (> 0), R14 = return address
+    zero_routine = [
+        "(__ZERO_LOCALS)", "@SP", "AM=M+1", "A=A-1", "M=0", "D=D-1",
+        "@__ZERO_LOCALS", "D;JGT", "@14", "A=M", "0;JMP"]
+
+    def __init__(self, cache_tos: bool = False, shared_calls: bool = False,
+                 compare: str = "inline"):
+        """Initializes writer.
+
+        Args:
+            cache_tos (bool, optional): If `True`, the top of the stack is
+                kept in D register between commands of a basic block, and is
+                spilled to RAM[SP] only at labels, jumps, calls and returns.
+            shared_calls (bool, optional): If `True`, `write_init` emits
+                global call, return and local-zeroing routines, and later
+                call, return and function commands jump to them instead of
+                inlining the frame handling.
+            compare (str, optional): Code of eq, gt and lt. 'inline' emits
+                the jumps at each call site (fast), 'shared' calls a routine
+                per comparison with return address in R14 (small), and 'auto'
+                inlines where `in_loop` is set and shares elsewhere.
+
+        Raises:
+            ValueError: If `compare` is unknown.
+        """
 
-    def __init__(self):
+        if compare not in self.compare_modes:
+            raise ValueError(f"Unknown compare mode: {compare}")
 
         self._code: List[str] = []
         self._func_count = 1
+        self._jump_count = 0
         self._arg_count = 0
+        self._func_name = ""
+
+        self.cache_tos = cache_tos
+        self._cached = False
+
+        self.shared_calls = shared_calls
+        self._has_routines = False
+
+        self.compare = compare
+        self.in_loop = False
+        self._has_compare_routines = False
 
         self.line_num = 0
         self.file_name = ""
 
+        # Set `CostReport` and `SourceMap` to record through `record`
+        self.report: Optional["vmtranslator.CostReport"] = None
+        self.source_map: Optional["sourcemap.SourceMap"] = None
+        self._drained = 0
+
     @property
     def code(self) -> List[str]:
         """Returns wrote codes. This method should be called at last."""
@@ -45,10 +112,87 @@ class VMCodeWriter:
             raise ValueError("Empty code.")
 
         if len(self._code) < 3 or self._code[-3:] != self.end_program:
+            start = len(self._code)
+            self._spill()
+            self.record("spill", start)
+            start = len(self._code)
             self._code += self.end_program
+            self.record("end", start, in_file=False)
+
+        return self._code
+
+    @property
+    def lines(self) -> List[str]:
+        """Returns codes wrote so far, without the end of program."""
 
         return self._code
 
+    def drain(self) -> List[str]:
+        """Returns codes wrote since the last drain and forgets them.
+
+        Top of the stack cached in D register is kept, so this may be called
+        between any commands.
+
+        Returns:
+            code (list of str): Assemble code.
+        """
+
+        code = self._code
+        self._code = []
+        self._drained += len(code)
+        return code
+
+    def close(self) -> List[str]:
+        """Finishes streaming translation.
+
+        Returns:
+            code (list of str): Rest of codes including the end of program.
+        """
+
+        start = len(self._code)
+        self._spill()
+        self.record("spill", start)
+        start = len(self._code)
+        self._code += self.end_program
+        self.record("end", start, in_file=False)
+        return self.drain()
+
+    def start_file(self, file_name: str) -> None:
+        """Starts translation of new file.
+
+        Args:
+            file_name (str): Name of file used for static variables and
+                labels.
+        """
+
+        start = len(self._code)
+        self._spill()
+        self.record("spill", start)
+        self.file_name = file_name
+        self._func_name = ""
+        self.line_num = 0
+        self._func_count = 1
+        self._jump_count = 0
+
+    def write_code(self, code: List[str],
+                   source_map: Optional["sourcemap.SourceMap"] = None,
+                   offset: int = 0) -> None:
+        """Writes code translated by another writer as is.
+
+        Args:
+            code (list of str): Assemble code.
+            source_map (SourceMap, optional): Map of `code` merged into
+                `source_map` of this writer if both are set.
+            offset (int, optional): Position of `code` in the lines of
+                `source_map`.
+        """
+
+        self._spill()
+        if self.source_map is not None and source_map is not None:
+            self.source_map.merge(
+                source_map, self._drained + len(self._code) - offset)
+        self._code += code
+
     def write_arithmetic(self, command: str) -> None:
         """Writes arithmetic operation.
 
@@ -56,11 +200,24 @@ class VMCodeWriter:
             command (str): Command name.
         """
 
+        if command in self.compare_jump and (
+                self.compare == "shared"
+                or (self.compare == "auto" and not self.in_loop)):
+            self._call_compare(command)
+            return
+
         has_args = command not in ["neg", "not"]
-        self._pop_stack()
-        if has_args:
+        self._pop_to_d()
+        if has_args and self.cache_tos:
+            self._code += ["@SP", "AM=M-1"]
+        elif has_args:
             self._pop_stack(save_to_d=False)
-        self._code += [f"D={'M' if has_args else ''}{self.op_table[command]}D"]
+        if command in ["add", "and", "or"]:
+            # Hack comp accepts only D+M, D&M and D|M
+            self._code += [f"D=D{self.op_table[command]}M"]
+        else:
+            self._code += [
+                f"D={'M' if has_args else ''}{self.op_table[command]}D"]
 
         if command == "eq":
             self._jump("JEQ")
@@ -69,7 +226,7 @@ class VMCodeWriter:
         elif command == "lt":
             self._jump("JLT")
 
-        self._push_stack()
+        self._push_d()
 
     def write_push(self, segment: str, index: str) -> None:
         """Writes push command.
@@ -79,14 +236,14 @@ class VMCodeWriter:
             segment (str): 1st argument, segment.
         """
 
+        self._spill()
         if segment == "constant":
-            self._push_stack(index)
+            self._code += [f"@{index}", "D=A"]
         elif segment == "static":
             self._load_static(index, push=True)
-            self._push_stack()
         else:
             self._load_memory(segment, index)
-            self._push_stack()
+        self._push_d()
 
     def write_pop(self, segment: str, index: str) -> None:
         """Writes pop command.
@@ -96,20 +253,112 @@ class VMCodeWriter:
             segment (str): 1st argument, segment.
         """
 
-        self._pop_stack()
+        self._pop_to_d()
         if segment == "static":
             self._load_static(index, push=False)
         else:
             self._code += ["@13", "M=D"]
             self._load_memory(segment, index, save_from_r13=True)
 
+    def write_move(self, src_segment: str, src_index: str, dst_segment: str,
+                   dst_index: str, offset: int = 0) -> None:
+        """Writes fused push and pop, which copies memory without the stack.
+
+        Args:
+            src_segment (str): Segment of push.
+            src_index (str): Index of push.
+            dst_segment (str): Segment of pop.
+            dst_index (str): Index of pop.
+            offset (int, optional): Constant added to the value.
+        """
+
+        self._spill()
+        address = self._direct_address(dst_segment, dst_index)
+        if address is None and int(dst_index) > 6:
+            # Destination address is computed first and kept in R13
+            self._code += [f"@{dst_index}", "D=A",
+                           f"@{self.symbol_hash[dst_segment]}", "D=D+M",
+                           "@13", "M=D"]
+            self._load_to_d(src_segment, src_index, offset)
+            self._code += ["@13", "A=M", "M=D"]
+            return
+
+        self._load_to_d(src_segment, src_index, offset)
+        self._store_d(dst_segment, dst_index)
+
+    def write_push_add(self, segment: str, index: str, offset: int) -> None:
+        """Writes fused push of memory plus constant.
+
+        Args:
+            segment (str): Segment of push.
+            index (str): Index of push.
+            offset (int): Constant added to the value.
+        """
+
+        self._spill()
+        self._load_to_d(segment, index, offset)
+        self._push_d()
+
+    def write_add_constant(self, offset: int) -> None:
+        """Writes fused push constant and add, which adds to the top.
+
+        Args:
+            offset (int): Constant added to the top of the stack.
+        """
+
+        if self._cached:
+            self._add_to_d(offset)
+        elif abs(offset) == 1:
+            self._code += ["@SP", "A=M-1", f"M=M{'+' if offset > 0 else '-'}1"]
+        elif offset != 0:
+            self._code += [f"@{abs(offset)}", "D=A", "@SP", "A=M-1",
+                           "M=D+M" if offset > 0 else "M=M-D"]
+
+    def record(self, command: str, start: int, in_file: bool = True
+               ) -> None:
+        """Records codes wrote since `start` to `report` and `source_map`.
+
+        Args:
+            command (str): Command type.
+            start (int): Length of `lines` before the command.
+            in_file (bool, optional): If `False`, codes are recorded without
+                file, function and source line, as bootstrap and end of
+                program.
+        """
+
+        if start >= len(self._code):
+            return
+
+        if self.report is not None:
+            self.report.record(self.file_name if in_file else "",
+                               self._func_name if in_file else "", command,
+                               self._code[start:])
+        if self.source_map is not None:
+            self.source_map.add(self._drained + start,
+                                self.line_num if in_file else -1,
+                                self.file_name if in_file else "")
+            self.source_map.length = self._drained + len(self._code)
+
     def write_init(self) -> None:
         """Initializes code."""
 
+        start = len(self._code)
         self._arg_count = 0
         self._code += ["@256", "D=A", "@SP", "M=D"]
-        self._init_function()
-        self._code += ["@Sys.init", "0;JMP", f"(RETURN{self._func_count - 1})"]
+        label = self._next_return_label()
+        self._init_function(label)
+        self._code += ["@Sys.init", "0;JMP", f"({label})"]
+
+        if self.shared_calls:
+            # Halt if Sys.init returns, then the shared routines
+            self._code += ["(__HALT)", "@__HALT", "0;JMP"]
+            self._code += self.call_routine
+            self._code += self.return_routine
+            self._code += self.zero_routine
+            self._has_routines = True
+        if self.compare != "inline":
+            self._write_compare_routines()
+        self.record("bootstrap", start, in_file=False)
 
     def write_label(self, label: str) -> None:
         """Writes label command.
@@ -118,7 +367,8 @@ class VMCodeWriter:
             label (str): Name of label.
         """
 
-        self._code += [f"@{label}"]
+        self._spill()
+        self._code += [f"({self._scoped(label)})"]
 
     def write_goto(self, label: str) -> None:
         """Writes goto command.
@@ -127,7 +377,8 @@ class VMCodeWriter:
             label (str): Label of destination.
         """
 
-        self._code += [f"@{label}", "0;JMP"]
+        self._spill()
+        self._code += [f"@{self._scoped(label)}", "0;JMP"]
 
     def write_if(self, label: str) -> None:
         """Writes if-goto command.
@@ -136,8 +387,8 @@ class VMCodeWriter:
             label (str): Label of destination.
         """
 
-        self._pop_stack()
-        self._code += [f"@{label}", "D;JNE"]
+        self._pop_to_d()
+        self._code += [f"@{self._scoped(label)}", "D;JNE"]
 
     def write_call(self, segment: str, index: str) -> None:
         """Writes call method.
@@ -147,15 +398,42 @@ class VMCodeWriter:
             index (str): 2nd argument, number of index.
         """
 
+        self._spill()
+        if self._has_routines:
+            num_args = int(index)
+            self._code += [f"@{segment}", "D=A", "@13", "M=D"]
+            if num_args <= 1:
+                self._code += ["@14", f"M={num_args}"]
+            else:
+                self._code += [f"@{num_args}", "D=A", "@14", "M=D"]
+            label = self._next_return_label()
+            self._code += [f"@{label}", "D=A", "@__CALL", "0;JMP",
+                           f"({label})"]
+            return
+
         self._arg_count = int(index)
-        self._init_function()
-        self._code += [f"@{segment}", f"(RETURN{self._func_count - 1})"]
+        label = self._next_return_label()
+        self._init_function(label)
+        self._code += [f"@{segment}", "0;JMP", f"({label})"]
 
     def write_return(self) -> None:
         """Writes return command."""
 
+        if self._has_routines:
+            routine = "__RETURN_D" if self._cached else "__RETURN"
+            self._code += [f"@{routine}", "0;JMP"]
+            self._cached = False
+            return
+
+        if self._cached:
+            # Return value is kept in R13 while D is used
+            self._code += ["@13", "M=D"]
         self._code += ["@5", "D=A", "@LCL", "A=M-D", "D=M", "@15", "M=D"]
-        self._pop_stack()
+        if self._cached:
+            self._code += ["@13", "D=M"]
+            self._cached = False
+        else:
+            self._pop_stack()
         self._code += ["@ARG", "A=M", "M=D", "D=A+1", "@SP", "M=D"]
 
         for register in ["THAT", "THIS", "ARG", "LCL"]:
@@ -171,7 +449,15 @@ class VMCodeWriter:
             num_locals (str): Number of local args.
         """
 
-        self._code += [f"@{func_name}"]
+        self._spill()
+        self._func_name = func_name
+        self._code += [f"({func_name})"]
+        if self._has_routines and int(num_locals) > 2:
+            label = self._next_return_label()
+            self._code += [f"@{label}", "D=A", "@14", "M=D", f"@{num_locals}",
+                           "D=A", "@__ZERO_LOCALS", "0;JMP", f"({label})"]
+            return
+
         for _ in range(int(num_locals)):
             self._code += ["@0", "D=A"]
             self._push_stack()
@@ -183,25 +469,87 @@ class VMCodeWriter:
         self._code += ["@SP", "A=M", "M=D"]
         self._code += ["@SP", "M=M+1"]
 
+    def _push_d(self) -> None:
+
+        if self.cache_tos:
+            self._cached = True
+        else:
+            self._push_stack()
+
+    def _pop_to_d(self) -> None:
+
+        if self._cached:
+            self._cached = False
+        else:
+            self._pop_stack()
+
+    def _spill(self) -> None:
+
+        if self._cached:
+            self._code += ["@SP", "AM=M+1", "A=A-1", "M=D"]
+            self._cached = False
+
+    def _scoped(self, label: str) -> str:
+
+        if self._func_name:
+            return f"{self._func_name}${label}"
+        return label
+
     def _pop_stack(self, save_to_d: bool = True) -> None:
 
         self._code += ["@SP", "M=M-1", "A=M"]
         if save_to_d:
             self._code += ["D=M"]
 
+    def _call_compare(self, command: str) -> None:
+
+        if not self._has_compare_routines:
+            self._write_compare_routines()
+
+        # Result is returned in D with both operands popped
+        name = command.upper()
+        if self._cached:
+            self._code += ["@13", "M=D"]
+            entry = f"__{name}_D"
+        else:
+            entry = f"__{name}"
+        label = self._next_return_label()
+        self._code += [f"@{label}", "D=A", f"@{entry}", "0;JMP", f"({label})"]
+        self._cached = False
+        self._push_d()
+
+    def _write_compare_routines(self) -> None:
+
+        self._code += ["@__COMPARE_END", "0;JMP"]
+        for name, jump_type in self.compare_jump.items():
+            self._code += self._compare_routine(name.upper(), jump_type)
+        self._code += ["(__COMPARE_END)"]
+        self._has_compare_routines = True
+
+    def _compare_routine(self, name: str, jump_type: str) -> List[str]:
+
+        # __NAME: stack [.. x y], __NAME_D: stack [.. x] and R13 = y.
+        # Return address is given in D and kept in R14.
+        return [
+            f"(__{name})", "@14", "M=D", "@SP", "AM=M-1", "D=M", "@13", "M=D",
+            f"@__{name}_CORE", "0;JMP",
+            f"(__{name}_D)", "@14", "M=D",
+            f"(__{name}_CORE)", "@SP", "AM=M-1", "D=M", "@13", "D=D-M",
+            f"@__{name}_TRUE", f"D;{jump_type}", "D=0", "@14", "A=M", "0;JMP",
+            f"(__{name}_TRUE)", "D=-1", "@14", "A=M", "0;JMP"]
+
     def _jump(self, jump_type: str) -> None:
 
         if jump_type not in self.jump_cmd:
             raise ValueError(f"Invalid jump type: {jump_type}")
 
-        self._code += [
-            f"@TRUE_JUMP.{self.file_name}.{self.line_num}",
-            f"D;{jump_type}", "D=0"]
-        self._code += [
-            f"@FALSE_NO_JUMP.{self.file_name}.{self.line_num}", "0;JMP"]
-        self._code += [
-            f"(TRUE_JUMP.{self.file_name}.{self.line_num})", "D=-1",
-            f"(FALSE_NO_JUMP.{self.file_name}.{self.line_num})"]
+        # Numbered per file, since inlined code may repeat source lines
+        suffix = f"{self.file_name}.{self._jump_count}"
+        self._jump_count += 1
+        self._code += [f"@TRUE_JUMP.{suffix}", f"D;{jump_type}", "D=0"]
+        self._code += [f"@FALSE_NO_JUMP.{suffix}", "0;JMP"]
+        self._code += [f"(TRUE_JUMP.{suffix})", "D=-1",
+                       f"(FALSE_NO_JUMP.{suffix})"]
 
     def _load_static(self, index: str, push: bool) -> None:
 
@@ -211,28 +559,87 @@ class VMCodeWriter:
         else:
             self._code += ["M=D"]
 
+    def _direct_address(self, segment: str, index: str) -> Optional[str]:
+
+        if segment == "static":
+            return f"{self.file_name}.{index}"
+        elif segment in self.direct_base:
+            return str(self.direct_base[segment] + int(index))
+        return None
+
+    def _load_to_d(self, segment: str, index: str, offset: int = 0) -> None:
+
+        address = self._direct_address(segment, index)
+        if segment == "constant" and 0 <= int(index) + offset <= 0x7fff:
+            self._code += [f"@{int(index) + offset}", "D=A"]
+            return
+        elif segment == "constant":
+            self._code += [f"@{index}", "D=A"]
+        elif address is not None:
+            self._code += [f"@{address}", "D=M"]
+        elif index == "0":
+            self._code += [f"@{self.symbol_hash[segment]}", "A=M", "D=M"]
+        elif index == "1":
+            self._code += [f"@{self.symbol_hash[segment]}", "A=M+1", "D=M"]
+        else:
+            self._code += [f"@{index}", "D=A",
+                           f"@{self.symbol_hash[segment]}", "A=D+M", "D=M"]
+        self._add_to_d(offset)
+
+    def _store_d(self, segment: str, index: str) -> None:
+
+        address = self._direct_address(segment, index)
+        if address is not None:
+            self._code += [f"@{address}", "M=D"]
+            return
+
+        # Small index is reached by increments of A register
+        self._code += [f"@{self.symbol_hash[segment]}"]
+        if index == "0":
+            self._code += ["A=M"]
+        else:
+            self._code += ["A=M+1"] + ["A=A+1"] * (int(index) - 1)
+        self._code += ["M=D"]
+
+    def _add_to_d(self, offset: int) -> None:
+
+        if abs(offset) == 1:
+            self._code += [f"D=D{'+' if offset > 0 else '-'}1"]
+        elif offset != 0:
+            self._code += [f"@{abs(offset)}",
+                           f"D=D{'+' if offset > 0 else '-'}A"]
+
     def _load_memory(self, segment: str, index: str,
                      save_from_r13: bool = False) -> None:
 
         self._code += [f"@{index}", "D=A", f"@{self.symbol_hash[segment]}"]
         if segment in ["temp", "pointer"]:
-            self._code += ["AD=A+D"]
+            self._code += ["AD=D+A"]
         else:
-            self._code += ["AD=M+D"]
+            self._code += ["AD=D+M"]
 
         if save_from_r13:
             self._code += ["@14", "M=D", "@13", "D=M", "@14", "A=M", "M=D"]
         else:
             self._code += ["D=M"]
 
-    def _init_function(self) -> None:
+    def _next_return_label(self) -> str:
+
+        # Counter is reset per file, so that files can be translated apart
+        if self.file_name:
+            label = f"{self.file_name}$RETURN{self._func_count}"
+        else:
+            label = f"RETURN{self._func_count}"
+        self._func_count += 1
+        return label
+
+    def _init_function(self, return_label: str) -> None:
 
-        self._code += [f"@RETURN{self._func_count}", "D=A"]
+        self._code += [f"@{return_label}", "D=A"]
         self._push_stack()
         for register in ["LCL", "ARG", "THIS", "THAT"]:
             self._code += [f"@{register}", "D=M"]
             self._push_stack()
 
         self._code += [f"@{self._arg_count + 5}", "D=A", "@SP", "D=M-D",
-                       "@ARG", "M=D", "SP", "D=M", "LCL", "M=D"]
-        self._func_count += 1
+                       "@ARG", "M=D", "@SP", "D=M", "@LCL", "M=D"]
@@ -0,0 +1,434 @@
+
+"""Interpreter running parsed VM code directly.
+
+ref)
+https://www.nand2tetris.org/project08
+"""
+
+from typing import Callable, Dict, List, Optional, Union
+
+import array
+import pathlib
+
+from nnttpy import vmtranslator
+
+
+class _Halt(Exception):
+    """Raised by the halting command."""
+
+
+class VMInterpreter:
+    """Interpreter of VM code on Hack memory layout.
+
+    Each command is decoded once into a closure which updates RAM and
+    returns the next program counter. RAM is a 16-bit `array('h')` with
+    SP, LCL, ARG, THIS and THAT at 0-4, temp at 5-12, static variables from
+    16 and the stack from 256. Arithmetic wraps around, and comparisons
+    use the sign of the wrapped difference as the code emitted by
+    `VMCodeWriter`.
+
+    If `Sys.init` is defined, the program starts as after `write_init`:
+    SP = 256 and `Sys.init` is called, and returning from it halts.
+    Otherwise, it starts at the first command with SP = 256 and the other
+    pointers left for the caller to set. A `goto` to itself (e.g. the usual
+    final `label END; goto END`) also halts.
+
+    Attributes:
+        ram (array.array): Memory.
+        pc (int): Index of the next decoded command.
+        halted (bool): Whether the program has halted.
+        statics (dict): Static variable name (e.g. 'MAIN.0') -> address.
+    """
+
+    ram_size = 24577
+    static_base = 16
+    stack_base = 256
+
+    def __init__(self):
+
+        self.ram = array.array("h", bytes(2 * self.ram_size))
+        self.pc = 0
+        self.halted = False
+        self.statics: Dict[str, int] = {}
+        self._code: List[Callable[[], int]] = []
+        self._functions: Dict[str, int] = {}
+
+    def load(self, path: Union[str, pathlib.Path]) -> None:
+        """Loads .vm file or folder and resets the machine.
+
+        Args:
+            path (str or pathlib.Path): Path to .vm file or folder containing
+                multiple .vm files.
+
+        Raises:
+            ValueError: If given path specifies a single file and its suffix is
+                not '.vm'.
+        """
+
+        input_path = pathlib.Path(path)
+        if input_path.is_dir():
+            files = sorted(input_path.glob("*.vm"))
+        elif input_path.suffix != ".vm":
+            raise ValueError(f"Expected .vm file, but given {input_path}.")
+        else:
+            files = [input_path]
+
+        program = {}
+        for p in files:
+            with p.open("r") as f:
+                program[p.stem.upper()] = vmtranslator.VMParser.parse(f)
+        self.load_program(program)
+
+    def load_program(self, program: Dict[
+            str, List["vmtranslator.VMInstruction"]]) -> None:
+        """Decodes parsed VM code and resets the machine.
+
+        Args:
+            program (dict): File name -> parsed VM code.
+
+        Raises:
+            ValueError: If a jump or call target is not defined.
+        """
+
+        # 1st pass: addresses of labels and functions
+        labels: Dict[str, int] = {}
+        self._functions = {}
+        pc = 0
+        for instructions in program.values():
+            func_name = ""
+            for inst in instructions:
+                if inst.opcode == vmtranslator.Opcode.LABEL:
+                    labels[f"{func_name}${inst.name}"] = pc
+                    continue
+                if inst.opcode == vmtranslator.Opcode.FUNCTION:
+                    func_name = inst.name
+                    self._functions[inst.name] = pc
+                pc += 1
+
+        # 2nd pass: closures, with halting command at the end
+        self.statics = {}
+        self._code = []
+        for file_name, instructions in program.items():
+            func_name = ""
+            for inst in instructions:
+                if inst.opcode == vmtranslator.Opcode.LABEL:
+                    continue
+                if inst.opcode == vmtranslator.Opcode.FUNCTION:
+                    func_name = inst.name
+                self._code.append(self._decode(
+                    inst, len(self._code), file_name, func_name, labels))
+        self._code.append(self._halt)
+
+        self.reset()
+
+    def reset(self) -> None:
+        """Clears RAM and sets up the bootstrap."""
+
+        ram = self.ram
+        ram[:] = array.array("h", bytes(2 * len(ram)))
+        ram[0] = self.stack_base
+        self.halted = False
+        self.pc = 0
+
+        entry = self._functions.get("Sys.init")
+        if entry is not None:
+            # Frame of 'call Sys.init 0' returning to the halting command
+            ram[self.stack_base] = _to_word(len(self._code) - 1)
+            ram[0] = self.stack_base + 5
+            ram[1] = self.stack_base + 5
+            ram[2] = self.stack_base
+            self.pc = entry
+
+    def run(self, max_steps: Optional[int] = None) -> int:
+        """Runs the program until it halts.
+
+        Args:
+            max_steps (int, optional): Maximum number of commands to run.
+
+        Returns:
+            steps (int): Number of executed commands.
+        """
+
+        code = self._code
+        pc = self.pc
+        steps = 0
+        try:
+            if max_steps is None:
+                while True:
+                    pc = code[pc]()
+                    steps += 1
+            else:
+                for steps in range(max_steps):
+                    pc = code[pc]()
+                steps = max_steps
+        except _Halt:
+            self.halted = True
+        finally:
+            self.pc = pc
+
+        return steps
+
+    def static(self, name: str) -> int:
+        """Reads static variable.
+
+        Args:
+            name (str): Variable name, e.g. 'MAIN.0'.
+
+        Returns:
+            value (int): Value, 0 if the variable is never used.
+        """
+
+        address = self.statics.get(name)
+        return 0 if address is None else self.ram[address]
+
+    @staticmethod
+    def _halt() -> int:
+
+        raise _Halt
+
+    def _static_address(self, name: str) -> int:
+
+        if name not in self.statics:
+            self.statics[name] = self.static_base + len(self.statics)
+        return self.statics[name]
+
+    def _decode(self, inst: "vmtranslator.VMInstruction", pc: int,
+                file_name: str, func_name: str, labels: Dict[str, int]
+                ) -> Callable[[], int]:
+        """Makes closure of single command.
+
+        Args:
+            inst (VMInstruction): Command other than label.
+            pc (int): Address of the command.
+            file_name (str): Name of file for static variables.
+            func_name (str): Current function for labels.
+            labels (dict): Scoped label -> address.
+
+        Returns:
+            closure (callable): Function running the command and returning
+                the next address.
+
+        Raises:
+            ValueError: If a jump or call target is not defined.
+        """
+
+        op = vmtranslator.Opcode
+        seg = vmtranslator.Segment
+        ram = self.ram
+        nxt = pc + 1
+        opcode = inst.opcode
+        index = inst.index
+
+        if opcode <= op.NOT:
+            return self._decode_arithmetic(opcode, nxt)
+
+        elif opcode == op.PUSH or opcode == op.POP:
+            segment = inst.segment
+            if segment == seg.CONSTANT:
+                if opcode == op.POP:
+                    raise ValueError(f"Cannot pop to constant: {inst}")
+
+                def push_constant():
+                    sp = ram[0]
+                    ram[sp] = index
+                    ram[0] = sp + 1
+                    return nxt
+                return push_constant
+
+            if segment in (seg.LOCAL, seg.ARGUMENT, seg.THIS, seg.THAT):
+                base = {seg.LOCAL: 1, seg.ARGUMENT: 2, seg.THIS: 3,
+                        seg.THAT: 4}[segment]
+                if opcode == op.PUSH:
+                    def push_indirect():
+                        sp = ram[0]
+                        ram[sp] = ram[ram[base] + index]
+                        ram[0] = sp + 1
+                        return nxt
+                    return push_indirect
+
+                def pop_indirect():
+                    sp = ram[0] - 1
+                    ram[ram[base] + index] = ram[sp]
+                    ram[0] = sp
+                    return nxt
+                return pop_indirect
+
+            if segment == seg.STATIC:
+                address = self._static_address(f"{file_name}.{index}")
+            elif segment == seg.POINTER:
+                address = 3 + index
+            else:
+                address = 5 + index
+
+            if opcode == op.PUSH:
+                def push_direct():
+                    sp = ram[0]
+                    ram[sp] = ram[address]
+                    ram[0] = sp + 1
+                    return nxt
+                return push_direct
+
+            def pop_direct():
+                sp = ram[0] - 1
+                ram[address] = ram[sp]
+                ram[0] = sp
+                return nxt
+            return pop_direct
+
+        elif opcode == op.GOTO or opcode == op.IF_GOTO:
+            target = labels.get(f"{func_name}${inst.name}")
+            if target is None:
+                raise ValueError(f"Undefined label: {inst}")
+
+            if opcode == op.GOTO:
+                if target == pc:
+                    return self._halt
+
+                def goto():
+                    return target
+                return goto
+
+            def if_goto():
+                sp = ram[0] - 1
+                ram[0] = sp
+                return target if ram[sp] else nxt
+            return if_goto
+
+        elif opcode == op.FUNCTION:
+            zeros = array.array("h", bytes(2 * index))
+
+            def function():
+                sp = ram[0]
+                ram[sp:sp + index] = zeros
+                ram[0] = sp + index
+                return nxt
+            return function
+
+        elif opcode == op.CALL:
+            target = self._functions.get(inst.name)
+            if target is None:
+                raise ValueError(f"Undefined function: {inst}")
+            ret = _to_word(nxt)
+
+            def call():
+                sp = ram[0]
+                ram[sp] = ret
+                ram[sp + 1:sp + 5] = ram[1:5]
+                ram[2] = sp - index
+                ram[1] = ram[0] = sp + 5
+                return target
+            return call
+
+        def return_():
+            frame = ram[1]
+            ret = ram[frame - 5] & 0xffff
+            arg = ram[2]
+            ram[arg] = ram[ram[0] - 1]
+            ram[0] = arg + 1
+            ram[1:5] = ram[frame - 4:frame]
+            return ret
+        return return_
+
+    def _decode_arithmetic(self, opcode: int, nxt: int
+                           ) -> Callable[[], int]:
+        """Makes closure of arithmetic command.
+
+        Args:
+            opcode (int): Opcode from add to not.
+            nxt (int): Address of the next command.
+
+        Returns:
+            closure (callable): Function running the command.
+        """
+
+        op = vmtranslator.Opcode
+        ram = self.ram
+
+        if opcode == op.NEG:
+            def neg():
+                sp = ram[0] - 1
+                x = ram[sp]
+                ram[sp] = -x if x != -0x8000 else x
+                return nxt
+            return neg
+
+        elif opcode == op.NOT:
+            def not_():
+                sp = ram[0] - 1
+                ram[sp] = ~ram[sp]
+                return nxt
+            return not_
+
+        elif opcode == op.ADD:
+            def add():
+                sp = ram[0] - 1
+                x = ram[sp - 1] + ram[sp]
+                if x > 0x7fff:
+                    x -= 0x10000
+                elif x < -0x8000:
+                    x += 0x10000
+                ram[sp - 1] = x
+                ram[0] = sp
+                return nxt
+            return add
+
+        elif opcode == op.AND:
+            def and_():
+                sp = ram[0] - 1
+                ram[sp - 1] &= ram[sp]
+                ram[0] = sp
+                return nxt
+            return and_
+
+        elif opcode == op.OR:
+            def or_():
+                sp = ram[0] - 1
+                ram[sp - 1] |= ram[sp]
+                ram[0] = sp
+                return nxt
+            return or_
+
+        elif opcode == op.EQ:
+            def eq():
+                sp = ram[0] - 1
+                ram[sp - 1] = -(ram[sp - 1] == ram[sp])
+                ram[0] = sp
+                return nxt
+            return eq
+
+        # sub, gt and lt use wrapped difference
+        def difference() -> int:
+            sp = ram[0] - 1
+            x = ram[sp - 1] - ram[sp]
+            if x > 0x7fff:
+                x -= 0x10000
+            elif x < -0x8000:
+                x += 0x10000
+            ram[0] = sp
+            return x
+
+        if opcode == op.SUB:
+            def sub():
+                x = difference()
+                ram[ram[0] - 1] = x
+                return nxt
+            return sub
+
+        elif opcode == op.GT:
+            def gt():
+                x = difference()
+                ram[ram[0] - 1] = -(x > 0)
+                return nxt
+            return gt
+
+        def lt():
+            x = difference()
+            ram[ram[0] - 1] = -(x < 0)
+            return nxt
+        return lt
+
+
+def _to_word(address: int) -> int:
+    """Stores ROM address up to 0xffff as signed 16-bit value."""
+
+    return address if address < 0x8000 else address - 0x10000
@@ -0,0 +1,652 @@
+
+"""Whole-program optimizations of parsed VM code.
+
+ref)
+https://en.wikipedia.org/wiki/Dead_code_elimination
+https://en.wikipedia.org/wiki/Inline_expansion
+"""
+
+from typing import Dict, List, Optional, Set, Tuple
+
+from nnttpy import vmtranslator
+
+
+class DeadFunctionEliminator:
+    """Removes functions unreachable from the entry point.
+
+    Call graph is built from `call` commands. Commands before the first
+    `function` of a file do not belong to any function and are kept.
+
+    Attributes:
+        entry (str): Root of the call graph.
+        removed (list of str): Names of removed functions of the last run.
+    """
+
+    def __init__(self, entry: str = "Sys.init"):
+
+        self.entry = entry
+        self.removed: List[str] = []
+
+    def eliminate(self, program: Dict[str, List["vmtranslator.VMInstruction"]]
+                  ) -> Dict[str, List["vmtranslator.VMInstruction"]]:
+        """Drops bodies of unreachable functions.
+
+        If the entry function is not defined, program is returned as is.
+
+        Args:
+            program (dict): File name -> parsed VM code.
+
+        Returns:
+            program (dict): File name -> parsed VM code of reachable
+                functions, in the same order.
+        """
+
+        self.removed = []
+        calls: Dict[str, Set[str]] = {}
+        for instructions in program.values():
+            callees: Set[str] = set()
+            for inst in instructions:
+                if inst.opcode == vmtranslator.Opcode.FUNCTION:
+                    callees = calls.setdefault(inst.name, set())
+                elif inst.opcode == vmtranslator.Opcode.CALL:
+                    callees.add(inst.name)
+
+        if self.entry not in calls:
+            return program
+
+        # Depth first search from entry
+        reachable = {self.entry}
+        stack = [self.entry]
+        while stack:
+            for callee in calls.get(stack.pop(), ()):
+                if callee not in reachable:
+                    reachable.add(callee)
+                    stack.append(callee)
+
+        self.removed = [name for name in calls if name not in reachable]
+        return {name: self._filter(instructions, reachable)
+                for name, instructions in program.items()}
+
+    @staticmethod
+    def _filter(instructions: List["vmtranslator.VMInstruction"],
+                reachable: Set[str]) -> List["vmtranslator.VMInstruction"]:
+        """Keeps commands outside functions and in reachable functions.
+
+        Args:
+            instructions (list of VMInstruction): Parsed VM code of a file.
+            reachable (set of str): Names of reachable functions.
+
+        Returns:
+            instructions (list of VMInstruction): Filtered code.
+        """
+
+        result = []
+        keep = True
+        for inst in instructions:
+            if inst.opcode == vmtranslator.Opcode.FUNCTION:
+                keep = inst.name in reachable
+            if keep:
+                result.append(inst)
+
+        return result
+
+
+class Inliner:
+    """Substitutes bodies of small functions into their callers.
+
+    Arguments and locals of the callee are moved to extra locals of the
+    caller, labels are renamed per call site, and `pointer` segment of the
+    caller is saved and restored if the callee sets it. Callees must be
+    non-recursive, fall into no other function, and return with exactly one
+    value on their own stack at every `return`. Calls in an inlined body are
+    kept as they are, and inlined commands have the line of the call.
+
+    Cost of a command is the number of Hack instructions `VMCodeWriter`
+    emits for it at the site, i.e. its ROM size, and the executed cost of
+    call, function and return adds the shared routines they jump to. A call
+    site is inlined only if moving arguments and locals executes fewer
+    instructions than the call, and sites are taken from the smallest
+    growth of ROM size until `budget` is used up. Costs are measured after
+    the bootstrap if `bootstrap` is set, so shared call, return and compare
+    routines are used as in the translated program.
+
+    Attributes:
+        max_size (int): Maximum cost of inlined function body.
+        budget (int): Maximum total growth of ROM size.
+        writer_options (dict): Arguments of `VMCodeWriter` for cost model.
+        bootstrap (bool): Whether the program starts with `write_init`.
+        inlined (dict): Callee name -> number of inlined call sites of the
+            last run.
+    """
+
+    # Change of stack depth indexed by opcode, from add to if-goto
+    _stack_effect = [-1, -1, 0, -1, -1, -1, -1, -1, 0, 1, -1, 0, 0, -1]
+
+    def __init__(self, max_size: int = 60, budget: int = 2000,
+                 writer_options: Optional[dict] = None,
+                 bootstrap: bool = True):
+
+        self.max_size = max_size
+        self.budget = budget
+        self.writer_options = writer_options or {}
+        self.bootstrap = bootstrap
+        self.inlined: Dict[str, int] = {}
+        self._costs: Dict[Tuple[int, int, int], int] = {}
+        self._site_count = 0
+
+    def inline(self, program: Dict[str, List["vmtranslator.VMInstruction"]]
+               ) -> Dict[str, List["vmtranslator.VMInstruction"]]:
+        """Inlines call sites of small functions.
+
+        Args:
+            program (dict): File name -> parsed VM code.
+
+        Returns:
+            program (dict): File name -> parsed VM code with inlined calls.
+        """
+
+        self.inlined = {}
+        self._site_count = 0
+        self._costs = {}
+
+        # Function name -> (file name, header, body)
+        functions: Dict[str, Tuple[str, "vmtranslator.VMInstruction",
+                                   List["vmtranslator.VMInstruction"]]] = {}
+        for file_name, instructions in program.items():
+            body: List["vmtranslator.VMInstruction"] = []
+            for inst in instructions:
+                if inst.opcode == vmtranslator.Opcode.FUNCTION:
+                    body = []
+                    functions[inst.name] = (file_name, inst, body)
+                else:
+                    body.append(inst)
+
+        calls = {name: {inst.name for inst in body
+                        if inst.opcode == vmtranslator.Opcode.CALL}
+                 for name, (_, _, body) in functions.items()}
+        candidates = {name: self._analyze(body)
+                      for name, (_, _, body) in functions.items()
+                      if not self._is_recursive(name, calls)}
+
+        # Collect profitable sites: (growth, file, position)
+        sites = []
+        for file_name, instructions in program.items():
+            in_function = False
+            for n, inst in enumerate(instructions):
+                if inst.opcode == vmtranslator.Opcode.FUNCTION:
+                    in_function = True
+                if inst.opcode != vmtranslator.Opcode.CALL or not in_function:
+                    continue
+                info = candidates.get(inst.name)
+                if info is None:
+                    continue
+                callee_file, header, _ = functions[inst.name]
+                max_arg, uses_static, pointers = info
+                if max_arg >= inst.index or (uses_static
+                                             and callee_file != file_name):
+                    continue
+                body_cost = self._body_cost(functions[inst.name][2])
+                if body_cost > self.max_size:
+                    continue
+                setup = self._setup_cost(inst.index, header.index,
+                                         len(pointers))
+                overhead = (self._executed_cost(inst)
+                            + self._executed_cost(header)
+                            + self._executed_cost(vmtranslator.VMInstruction(
+                                vmtranslator.Opcode.RETURN)))
+                if setup >= overhead:
+                    continue
+                sites.append((body_cost + setup - self._cost(inst),
+                              file_name, n))
+
+        selected: Dict[str, Set[int]] = {}
+        total = 0
+        for growth, file_name, n in sorted(sites):
+            if total + growth > self.budget:
+                break
+            total += growth
+            selected.setdefault(file_name, set()).add(n)
+
+        return {file_name: self._rewrite(instructions,
+                                         selected.get(file_name, set()),
+                                         functions, candidates)
+                for file_name, instructions in program.items()}
+
+    def _rewrite(self, instructions: List["vmtranslator.VMInstruction"],
+                 sites: Set[int], functions: dict, candidates: dict
+                 ) -> List["vmtranslator.VMInstruction"]:
+        """Replaces selected calls of a file with function bodies.
+
+        Args:
+            instructions (list of VMInstruction): Parsed VM code of a file.
+            sites (set of int): Positions of calls to be inlined.
+            functions (dict): Function name -> (file name, header, body).
+            candidates (dict): Function name -> result of `_analyze`.
+
+        Returns:
+            instructions (list of VMInstruction): Rewritten code.
+        """
+
+        if not sites:
+            return instructions
+
+        result: List["vmtranslator.VMInstruction"] = []
+        header_pos = -1
+        num_locals = 0
+        extra = 0
+        for n, inst in enumerate(instructions):
+            if inst.opcode == vmtranslator.Opcode.FUNCTION:
+                self._extend_locals(result, header_pos, extra)
+                header_pos = len(result)
+                num_locals = inst.index
+                extra = 0
+            if n not in sites:
+                result.append(inst)
+                continue
+
+            _, header, body = functions[inst.name]
+            pointers = candidates[inst.name][2]
+            extra = max(extra, inst.index + header.index + len(pointers))
+            result += self._expand(inst, header, body, pointers, num_locals)
+            self.inlined[inst.name] = self.inlined.get(inst.name, 0) + 1
+        self._extend_locals(result, header_pos, extra)
+
+        return result
+
+    def _expand(self, call: "vmtranslator.VMInstruction",
+                header: "vmtranslator.VMInstruction",
+                body: List["vmtranslator.VMInstruction"], pointers: List[int],
+                base: int) -> List["vmtranslator.VMInstruction"]:
+        """Makes inlined code of a call site.
+
+        Args:
+            call (VMInstruction): Call command.
+            header (VMInstruction): Function command of callee.
+            body (list of VMInstruction): Commands of callee.
+            pointers (list of int): Pointer indices set by callee.
+            base (int): First free local of caller.
+
+        Returns:
+            code (list of VMInstruction): Inlined commands.
+        """
+
+        op = vmtranslator.Opcode
+        seg = vmtranslator.Segment
+        line = call.line
+        prefix = f"INLINE{self._site_count}"
+        self._site_count += 1
+
+        def new(opcode, segment=seg.NONE, index=0, name=""):
+            return vmtranslator.VMInstruction(opcode, segment, index, name,
+                                              line)
+
+        num_args = call.index
+        saves = base + num_args + header.index
+        code = [new(op.POP, seg.LOCAL, base + i)
+                for i in reversed(range(num_args))]
+        for i in range(header.index):
+            code += [new(op.PUSH, seg.CONSTANT, 0),
+                     new(op.POP, seg.LOCAL, base + num_args + i)]
+        for i, pointer in enumerate(pointers):
+            code += [new(op.PUSH, seg.POINTER, pointer),
+                     new(op.POP, seg.LOCAL, saves + i)]
+
+        # Body is mapped to the call line, as the callee may be in another
+        # file
+        for n, inst in enumerate(body):
+            if inst.segment == seg.ARGUMENT:
+                inst = new(inst.opcode, seg.LOCAL, base + inst.index)
+            elif inst.segment == seg.LOCAL:
+                inst = new(inst.opcode, seg.LOCAL,
+                           base + num_args + inst.index)
+            elif inst.opcode in (op.LABEL, op.GOTO, op.IF_GOTO):
+                inst = new(inst.opcode, name=f"{prefix}.{inst.name}")
+            elif inst.opcode == op.RETURN:
+                if n == len(body) - 1:
+                    continue
+                inst = new(op.GOTO, name=prefix)
+            else:
+                inst = new(inst.opcode, inst.segment, inst.index, inst.name)
+            code.append(inst)
+
+        code.append(new(op.LABEL, name=prefix))
+        for i, pointer in enumerate(pointers):
+            code += [new(op.PUSH, seg.LOCAL, saves + i),
+                     new(op.POP, seg.POINTER, pointer)]
+
+        return code
+
+    @staticmethod
+    def _extend_locals(result: List["vmtranslator.VMInstruction"],
+                       header_pos: int, extra: int) -> None:
+
+        if header_pos < 0 or extra == 0:
+            return
+
+        header = result[header_pos]
+        result[header_pos] = vmtranslator.VMInstruction(
+            header.opcode, header.segment, header.index + extra, header.name,
+            header.line)
+
+    @staticmethod
+    def _is_recursive(name: str, calls: Dict[str, Set[str]]) -> bool:
+        """Checks whether function can reach itself in call graph."""
+
+        visited: Set[str] = set()
+        stack = list(calls.get(name, ()))
+        while stack:
+            callee = stack.pop()
+            if callee == name:
+                return True
+            if callee not in visited:
+                visited.add(callee)
+                stack.extend(calls.get(callee, ()))
+
+        return False
+
+    def _analyze(self, body: List["vmtranslator.VMInstruction"]
+                 ) -> Optional[Tuple[int, bool, List[int]]]:
+        """Checks whether function body can be inlined.
+
+        Stack depth is tracked from the start of the body. It must not go
+        below zero, must agree at each label, and must be one at returns.
+
+        Args:
+            body (list of VMInstruction): Commands after function command.
+
+        Returns:
+            info (tuple or None): Maximum argument index, whether static
+                segment is used and pointer indices set by the body. `None`
+                if the body cannot be inlined.
+        """
+
+        op = vmtranslator.Opcode
+        seg = vmtranslator.Segment
+        max_arg = -1
+        uses_static = False
+        pointers: Set[int] = set()
+        depths: Dict[str, int] = {}
+        depth = 0
+        reachable = True
+        for inst in body:
+            if inst.opcode == op.LABEL:
+                known = depths.get(inst.name)
+                if not reachable:
+                    if known is None:
+                        return None
+                    depth = known
+                elif known is not None and known != depth:
+                    return None
+                depths[inst.name] = depth
+                reachable = True
+                continue
+            if not reachable:
+                continue
+
+            if inst.segment == seg.ARGUMENT:
+                max_arg = max(max_arg, inst.index)
+            elif inst.segment == seg.STATIC:
+                uses_static = True
+            elif inst.segment == seg.POINTER and inst.opcode == op.POP:
+                pointers.add(inst.index)
+
+            if inst.opcode == op.RETURN:
+                if depth != 1:
+                    return None
+                reachable = False
+                continue
+            elif inst.opcode == op.CALL:
+                depth += 1 - inst.index
+            else:
+                depth += self._stack_effect[inst.opcode]
+            if depth < 0:
+                return None
+
+            if inst.opcode in (op.GOTO, op.IF_GOTO):
+                if depths.setdefault(inst.name, depth) != depth:
+                    return None
+                reachable = inst.opcode == op.IF_GOTO
+
+        if reachable or not body:
+            return None
+
+        return max_arg, uses_static, sorted(pointers)
+
+    def _body_cost(self, body: List["vmtranslator.VMInstruction"]) -> int:
+        """Cost of inlined body, where returns except the last are jumps."""
+
+        goto = vmtranslator.VMInstruction(vmtranslator.Opcode.GOTO)
+        return sum(self._cost(goto if inst.opcode == vmtranslator.Opcode.RETURN
+                              else inst) for inst in body[:-1])
+
+    def _setup_cost(self, num_args: int, num_locals: int,
+                    num_pointers: int) -> int:
+        """Cost of moving arguments, zeroing locals and saving pointers."""
+
+        op = vmtranslator.Opcode
+        seg = vmtranslator.Segment
+        pop_local = self._cost(vmtranslator.VMInstruction(op.POP, seg.LOCAL))
+        push_local = self._cost(
+            vmtranslator.VMInstruction(op.PUSH, seg.LOCAL))
+        push_zero = self._cost(
+            vmtranslator.VMInstruction(op.PUSH, seg.CONSTANT))
+        push_pointer = self._cost(
+            vmtranslator.VMInstruction(op.PUSH, seg.POINTER))
+        pop_pointer = self._cost(
+            vmtranslator.VMInstruction(op.POP, seg.POINTER))
+
+        return (num_args * pop_local + num_locals * (push_zero + pop_local)
+                + num_pointers * (push_pointer + pop_local + push_local
+                                  + pop_pointer))
+
+    def _executed_cost(self, inst: "vmtranslator.VMInstruction") -> int:
+        """Number of Hack instructions executed for a call, function or
+        return, including shared routines.
+
+        Args:
+            inst (VMInstruction): VM command.
+
+        Returns:
+            cost (int): Number of executed instructions.
+        """
+
+        cost = self._cost(inst)
+        if not (self.bootstrap and self.writer_options.get("shared_calls")):
+            return cost
+
+        op = vmtranslator.Opcode
+        writer = vmtranslator.VMCodeWriter
+        if inst.opcode == op.CALL:
+            routine = writer.call_routine
+        elif inst.opcode == op.RETURN:
+            routine = writer.return_routine
+        elif inst.opcode == op.FUNCTION and inst.index > 2:
+            # Loop of __ZERO_LOCALS runs once per local before the jump back
+            routine = writer.zero_routine[1:]
+            loop = routine.index("D;JGT") + 1
+            return cost + loop * inst.index + len(routine) - loop
+        else:
+            return cost
+
+        return cost + sum(1 for line in routine if not line.startswith("("))
+
+    def _cost(self, inst: "vmtranslator.VMInstruction") -> int:
+        """Number of Hack instructions emitted for a command.
+
+        Args:
+            inst (VMInstruction): VM command.
+
+        Returns:
+            cost (int): Number of instructions without label declarations.
+        """
+
+        key = (inst.opcode, inst.segment, inst.index)
+        cost = self._costs.get(key)
+        if cost is not None:
+            return cost
+
+        # Measure after shared routines are written once
+        op = vmtranslator.Opcode
+        writer = vmtranslator.VMCodeWriter(**self.writer_options)
+        if self.bootstrap:
+            writer.write_init()
+        elif writer.compare != "inline":
+            writer.write_arithmetic("eq")
+        writer.start_file("F")
+        start = len(writer.lines)
+        if inst.opcode <= op.NOT:
+            writer.write_arithmetic(vmtranslator.opcode_names[inst.opcode])
+        elif inst.opcode == op.PUSH:
+            writer.write_push(vmtranslator.segment_names[inst.segment],
+                              str(inst.index))
+        elif inst.opcode == op.POP:
+            writer.write_pop(vmtranslator.segment_names[inst.segment],
+                             str(inst.index))
+        elif inst.opcode == op.LABEL:
+            writer.write_label("L")
+        elif inst.opcode == op.GOTO:
+            writer.write_goto("L")
+        elif inst.opcode == op.IF_GOTO:
+            writer.write_if("L")
+        elif inst.opcode == op.FUNCTION:
+            writer.write_function("F", str(inst.index))
+        elif inst.opcode == op.CALL:
+            writer.write_call("F", str(inst.index))
+        else:
+            writer.write_return()
+
+        cost = sum(1 for line in writer.lines[start:]
+                   if not line.startswith("("))
+        self._costs[key] = cost
+        return cost
+
+
+class ConstantFolder:
+    """Folds arithmetic of constants and removes identity operations.
+
+    Values follow 16-bit two's complement. Comparisons are folded by the
+    sign of the wrapped difference, as in code emitted by `VMCodeWriter`.
+    Constants are tracked only within straight-line code, so labels and any
+    other command end folding. Values out of `push constant` range are
+    written as `push constant -x; neg` or `push constant 32767; not`.
+
+    Attributes:
+        hits (dict): Rule name -> number of applications of the last run.
+    """
+
+    # Operations indexed by opcode, from add to not
+    _binary = [
+        lambda x, y: x + y, lambda x, y: x - y, None,
+        lambda x, y: -(x == y),
+        lambda x, y: -(_to_signed(x - y) > 0),
+        lambda x, y: -(_to_signed(x - y) < 0),
+        lambda x, y: x & y, lambda x, y: x | y, None]
+    _unary = [None, None, lambda x: -x, None, None, None, None, None,
+              lambda x: ~x]
+    # Right operand which does not change left operand
+    _identity = [0, 0, None, None, None, None, -1, 0, None]
+
+    def __init__(self):
+
+        self.hits: Dict[str, int] = {"fold": 0, "identity": 0,
+                                     "double_unary": 0}
+
+    def fold(self, program: Dict[str, List["vmtranslator.VMInstruction"]]
+             ) -> Dict[str, List["vmtranslator.VMInstruction"]]:
+        """Folds constants of all files.
+
+        Args:
+            program (dict): File name -> parsed VM code.
+
+        Returns:
+            program (dict): File name -> folded VM code.
+        """
+
+        self.hits = {name: 0 for name in self.hits}
+        return {name: self.fold_file(instructions)
+                for name, instructions in program.items()}
+
+    def fold_file(self, instructions: List["vmtranslator.VMInstruction"]
+                  ) -> List["vmtranslator.VMInstruction"]:
+        """Folds constants of single file.
+
+        Args:
+            instructions (list of VMInstruction): Parsed VM code.
+
+        Returns:
+            instructions (list of VMInstruction): Folded VM code.
+        """
+
+        op = vmtranslator.Opcode
+        result: List["vmtranslator.VMInstruction"] = []
+        # Constants at the end of result: (start position, value)
+        constants: List[Tuple[int, int]] = []
+        for inst in instructions:
+            if (inst.opcode == op.PUSH
+                    and inst.segment == vmtranslator.Segment.CONSTANT):
+                constants.append((len(result), _to_signed(inst.index)))
+                result.append(inst)
+                continue
+
+            if inst.opcode > op.NOT:
+                pass
+            elif self._binary[inst.opcode] is not None and constants:
+                start, y = constants[-1]
+                if len(constants) >= 2:
+                    start, x = constants[-2]
+                    del result[start:], constants[-2:]
+                    self._push(result, constants,
+                               self._binary[inst.opcode](x, y), inst.line)
+                    self.hits["fold"] += 1
+                    continue
+                if self._identity[inst.opcode] == y:
+                    del result[start:], constants[-1:]
+                    self.hits["identity"] += 1
+                    continue
+            elif self._unary[inst.opcode] is not None:
+                if constants:
+                    start, x = constants.pop()
+                    del result[start:]
+                    self._push(result, constants, self._unary[inst.opcode](x),
+                               inst.line)
+                    self.hits["fold"] += 1
+                    continue
+                if result and result[-1].opcode == inst.opcode:
+                    result.pop()
+                    self.hits["double_unary"] += 1
+                    continue
+
+            constants.clear()
+            result.append(inst)
+
+        return result
+
+    @staticmethod
+    def _push(result: List["vmtranslator.VMInstruction"],
+              constants: List[Tuple[int, int]], value: int, line: int
+              ) -> None:
+        """Appends commands pushing a 16-bit value."""
+
+        op = vmtranslator.Opcode
+        constant = vmtranslator.Segment.CONSTANT
+        value = _to_signed(value)
+        constants.append((len(result), value))
+        if value >= 0:
+            result.append(vmtranslator.VMInstruction(
+                op.PUSH, constant, value, line=line))
+        elif value == -0x8000:
+            result += [
+                vmtranslator.VMInstruction(op.PUSH, constant, 0x7fff,
+                                           line=line),
+                vmtranslator.VMInstruction(op.NOT, line=line)]
+        else:
+            result += [
+                vmtranslator.VMInstruction(op.PUSH, constant, -value,
+                                           line=line),
+                vmtranslator.VMInstruction(op.NEG, line=line)]
+
+
+def _to_signed(value: int) -> int:
+    """Wraps integer to 16-bit two's complement."""
+
+    return (value + 0x8000) % 0x10000 - 0x8000
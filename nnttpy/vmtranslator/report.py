@@ -0,0 +1,139 @@
+
+"""Static cost report of translated VM code."""
+
+from typing import Dict, List, Tuple
+
+import json
+
+
+class CostReport:
+    """Number of Hack instructions emitted per VM command.
+
+    Costs are recorded per (file, function, command type) and aggregated on
+    demand. Label declarations are not counted, so the total equals the ROM
+    size of the translated program.
+
+    Attributes:
+        records (dict): (file, function, command) -> [number of commands,
+            number of Hack instructions].
+    """
+
+    def __init__(self):
+
+        self.records: Dict[Tuple[str, str, str], List[int]] = {}
+
+    def record(self, file_name: str, func_name: str, command: str,
+               code: List[str]) -> None:
+        """Records code emitted for one command.
+
+        Args:
+            file_name (str): Source file.
+            func_name (str): Function containing the command.
+            command (str): Command type, e.g. 'push'.
+            code (list of str): Emitted assemble code.
+        """
+
+        count = 0
+        for line in code:
+            if not line.startswith("("):
+                count += 1
+
+        key = (file_name, func_name, command)
+        entry = self.records.get(key)
+        if entry is None:
+            self.records[key] = [1, count]
+        else:
+            entry[0] += 1
+            entry[1] += count
+
+    def merge(self, other: "CostReport") -> None:
+        """Adds records of another report, e.g. from a worker process.
+
+        Args:
+            other (CostReport): Report to be added.
+        """
+
+        for key, (commands, instructions) in other.records.items():
+            entry = self.records.setdefault(key, [0, 0])
+            entry[0] += commands
+            entry[1] += instructions
+
+    @property
+    def total(self) -> int:
+        """Total number of Hack instructions."""
+
+        return sum(instructions for _, instructions in self.records.values())
+
+    def aggregate(self, key: str) -> Dict[str, Dict[str, int]]:
+        """Sums records by file, function or command.
+
+        Args:
+            key (str): 'file', 'function' or 'command'.
+
+        Returns:
+            costs (dict): Name -> {'commands': n, 'instructions': m}, sorted
+                by instructions in descending order.
+
+        Raises:
+            ValueError: If `key` is unknown.
+        """
+
+        keys = ["file", "function", "command"]
+        if key not in keys:
+            raise ValueError(f"Unknown key: {key}")
+        position = keys.index(key)
+
+        costs: Dict[str, Dict[str, int]] = {}
+        for record_key, (commands, instructions) in self.records.items():
+            entry = costs.setdefault(record_key[position],
+                                     {"commands": 0, "instructions": 0})
+            entry["commands"] += commands
+            entry["instructions"] += instructions
+
+        return dict(sorted(costs.items(),
+                           key=lambda item: (-item[1]["instructions"],
+                                             item[0])))
+
+    def to_dict(self) -> dict:
+        """Returns report as JSON serializable dict."""
+
+        return {
+            "total": self.total,
+            "files": self.aggregate("file"),
+            "functions": self.aggregate("function"),
+            "commands": self.aggregate("command"),
+        }
+
+    def to_json(self, indent: int = 2) -> str:
+        """Returns report as JSON string."""
+
+        return json.dumps(self.to_dict(), indent=indent)
+
+    def to_text(self, limit: int = 0) -> str:
+        """Returns report as text tables sorted by cost.
+
+        Args:
+            limit (int, optional): Maximum rows per table, 0 for all.
+
+        Returns:
+            text (str): Tables of files, functions and commands.
+        """
+
+        total = self.total
+        lines = [f"Total: {total} instructions"]
+        for title, key in [("File", "file"), ("Function", "function"),
+                           ("Command", "command")]:
+            rows = list(self.aggregate(key).items())
+            if limit:
+                rows = rows[:limit]
+            # Bootstrap and end of program have no file and function
+            rows = [(name or "-", cost) for name, cost in rows]
+            width = max([len(title)] + [len(name) for name, _ in rows])
+            lines += ["", f"{title:<{width}}  {'commands':>8}  "
+                      f"{'instrs':>8}  {'share':>6}"]
+            for name, cost in rows:
+                share = cost["instructions"] / total if total else 0.0
+                lines.append(f"{name:<{width}}  {cost['commands']:>8}  "
+                             f"{cost['instructions']:>8}  {share:>6.1%}")
+
+        return "\n".join(lines)
@@ -6,20 +6,100 @@ https://github.com/chrisshyi/VMTranslator/blob/master/src/main/Translator.java
 https://medium.com/@yizhe87/from-nand-to-tetris-nand2tetris-project-7-8-e74e8e009e71
 """
 
-from typing import Union, List
+from typing import (Dict, Iterable, Iterator, List, Optional, TextIO,
+                    Tuple, Union)
 
+import array
+import concurrent.futures
+import itertools
 import pathlib
 
-from nnttpy import vmtranslator
+from nnttpy import assembler, sourcemap, vmtranslator
 
 
 class VMTranslator:
     """Translator for VM code."""
 
-    def __init__(self):
+    # Fused command sequences, matched longest first. `X` and `Y` are any
+    # push and pop, `k` is a constant and add may be sub.
+    fusion_catalog = {
+        "move_add": "push X; push constant k; add; pop Y",
+        "push_add": "push X; push constant k; add",
+        "move": "push X; pop Y",
+        "add_constant": "push constant k; add",
+    }
+    _fusion_lengths = {name: pattern.count(";") + 1
+                       for name, pattern in fusion_catalog.items()}
 
+    def __init__(self, cache_tos: bool = False, shared_calls: bool = False,
+                 compare: str = "inline", eliminate_dead: bool = False,
+                 inline: bool = False, fold_constants: bool = False,
+                 fuse: bool = False, report: bool = False,
+                 source_map: bool = False):
+        """Initializes translator.
+
+        Args:
+            cache_tos (bool, optional): Keeps the top of the stack in D
+                register, see `VMCodeWriter`.
+            shared_calls (bool, optional): Uses shared call and return
+                routines for directories, see `VMCodeWriter`.
+            compare (str, optional): 'inline', 'shared' or 'auto' code of
+                comparisons, see `VMCodeWriter`. With 'auto', comparisons
+                inside loops are inlined.
+            eliminate_dead (bool, optional): Removes functions unreachable
+                from `Sys.init` before code generation. Names of removed
+                functions are kept in `removed`.
+            inline (bool, optional): Inlines calls of small functions, see
+                `Inliner`. Runs before dead function elimination, so fully
+                inlined functions are removed if both are set.
+            fold_constants (bool, optional): Folds constant arithmetic and
+                removes identity operations before other passes, see
+                `ConstantFolder`.
+            fuse (bool, optional): Writes sequences in `fusion_catalog` as
+                direct memory operations. Number of matches per pattern is
+                kept in `fusion_hits`.
+            report (bool, optional): Records number of Hack instructions per
+                file, function and command type in `report`.
+            source_map (bool, optional): Records (VM file, VM line) of each
+                line of assemble code in `source_map`.
+        """
+
+        self._options = {"cache_tos": cache_tos, "shared_calls": shared_calls,
+                         "compare": compare}
         self._parser = vmtranslator.VMParser()
-        self._writer = vmtranslator.VMCodeWriter()
+        self._writer = vmtranslator.VMCodeWriter(**self._options)
+        if report:
+            self._writer.report = vmtranslator.CostReport()
+        if source_map:
+            self._writer.source_map = sourcemap.SourceMap()
+        self._eliminator = (vmtranslator.DeadFunctionEliminator()
+                            if eliminate_dead else None)
+        self._inliner = (vmtranslator.Inliner(writer_options=self._options)
+                         if inline else None)
+        self._folder = (vmtranslator.ConstantFolder() if fold_constants
+                        else None)
+        self._fuse = fuse
+        self.fusion_hits: Dict[str, int] = {
+            name: 0 for name in self.fusion_catalog}
+
+        # Opcode -> writer call
+        writer = self._writer
+        arithmetic = [
+            (lambda name: lambda inst: writer.write_arithmetic(name))(name)
+            for name in vmtranslator.opcode_names[:9]]
+        segments = vmtranslator.segment_names
+        self._dispatch = arithmetic + [
+            lambda inst: writer.write_push(
+                segments[inst.segment], str(inst.index)),
+            lambda inst: writer.write_pop(
+                segments[inst.segment], str(inst.index)),
+            lambda inst: writer.write_label(inst.name),
+            lambda inst: writer.write_goto(inst.name),
+            lambda inst: writer.write_if(inst.name),
+            lambda inst: writer.write_function(inst.name, str(inst.index)),
+            lambda inst: writer.write_call(inst.name, str(inst.index)),
+            lambda inst: writer.write_return(),
+        ]
 
     def translate(self, path: Union[str, pathlib.Path]) -> List[str]:
         """Translate given VM codes.
@@ -36,55 +116,422 @@ class VMTranslator:
                 not '.vm'.
         """
 
+        for name, instructions in self._iter_program(path, lazy=True):
+            self._translate_file(name, instructions)
+
+        return self._writer.code
+
+    def iter_translate(self, path: Union[str, pathlib.Path]) -> Iterator[str]:
+        """Translate given VM codes lazily.
+
+        Files are read one by one and assemble code is yielded as it is
+        written, ending with the end of program. Each file is parsed line
+        by line and only a few commands are kept for fusion. A file is read
+        fully if `compare` is 'auto', which finds loops in advance, and the
+        whole program is read if whole-program passes (`fold_constants`,
+        `inline` or `eliminate_dead`) are enabled.
+
+        Args:
+            path (str or pathlib.Path): Path to .vm file or folder containing
+                multiple .vm files.
+
+        Yields:
+            line (str): Line of assemble code.
+
+        Raises:
+            ValueError: If given path specifies a single file and its suffix is
+                not '.vm'.
+        """
+
+        writer = self._writer
+        for name, instructions in self._iter_program(path, lazy=True):
+            yield from writer.drain()
+            writer.start_file(name)
+            for _ in self._iter_write(instructions):
+                yield from writer.drain()
+        yield from writer.close()
+
+    def translate_to_file(self, path: Union[str, pathlib.Path],
+                          f: TextIO) -> None:
+        """Translate given VM codes and writes them to file as produced.
+
+        Args:
+            path (str or pathlib.Path): Path to .vm file or folder containing
+                multiple .vm files.
+            f (TextIO): Opened output file. Lines are separated by newline
+                without a trailing one.
+        """
+
+        lines = self.iter_translate(path)
+        f.write(next(lines))
+        for line in lines:
+            f.write("\n")
+            f.write(line)
+
+    def translate_parallel(self, path: Union[str, pathlib.Path],
+                           max_workers: Optional[int] = None) -> List[str]:
+        """Translate given VM codes file by file in a process pool.
+
+        Files are translated independently and concatenated in sorted order.
+        Labels are unique per file, so output is the same as `translate`.
+
+        Args:
+            path (str or pathlib.Path): Path to .vm file or folder containing
+                multiple .vm files.
+            max_workers (int, optional): Number of processes. Defaults to the
+                number of CPUs.
+
+        Returns:
+            code (list of str): Translated assemble code.
+        """
+
+        program = dict(self._iter_program(path))
+        with concurrent.futures.ProcessPoolExecutor(max_workers) as executor:
+            results = executor.map(
+                _translate_file, program.keys(), program.values(),
+                itertools.repeat({**self._options, "fuse": self._fuse,
+                                  "report": self.report is not None,
+                                  "source_map": self.source_map is not None}),
+                itertools.repeat(pathlib.Path(path).is_dir()))
+            for code, hits, report, source_map, start in results:
+                self._writer.write_code(code, source_map, start)
+                for name, count in hits.items():
+                    self.fusion_hits[name] += count
+                if report is not None:
+                    self.report.merge(report)
+
+        return self._writer.code
+
+    def translate_to_rom(self, path: Union[str, pathlib.Path]
+                         ) -> array.array:
+        """Translate given VM codes directly to Hack machine code.
+
+        Lines are encoded as they are written, without re-parsing the whole
+        assemble code. The code writer emits few distinct lines, so each is
+        parsed once and its encoding is reused from a table. Label
+        references are left as holes and fixed up at the end, and the other
+        symbols are allocated in RAM in first-seen order, so words are the
+        same as `Assembler(translate(path)).assemble_words()`.
+
+        Args:
+            path (str or pathlib.Path): Path to .vm file or folder containing
+                multiple .vm files.
+
+        Returns:
+            words (array.array): Machine code of typecode 'H'.
+
+        Raises:
+            ValueError: If a label is declared twice.
+        """
+
+        parser = assembler.Parser
+        code_table = assembler.Converter.code_table
+        symbols = assembler.Assembler._predefined_table()
+
+        # Line -> word of C-commands and numeric A-commands, and line ->
+        # (command type, symbol) of the other lines
+        known_words: Dict[str, int] = {}
+        symbolic: Dict[str, Tuple[int, str]] = {}
+        words = array.array("H")
+        refs: List[Tuple[int, str]] = []
+        labels: Dict[str, int] = {}
+        for line in self.iter_translate(path):
+            word = known_words.get(line)
+            if word is not None:
+                words.append(word)
+                continue
+
+            entry = symbolic.get(line)
+            if entry is None:
+                inst = parser.parse(line)
+                if inst.kind == parser.c_command:
+                    word = code_table[(inst.comp, inst.dest, inst.jump)]
+                elif (inst.kind == parser.a_command
+                      and inst.symbol.isdigit()):
+                    word = int(inst.symbol)
+                if word is not None:
+                    known_words[line] = word
+                    words.append(word)
+                    continue
+                entry = symbolic[line] = (inst.kind, inst.symbol)
+
+            kind, symbol = entry
+            if kind == parser.a_command:
+                refs.append((len(words), symbol))
+                words.append(0)
+            elif kind == parser.l_command:
+                if symbol in labels or symbol in symbols:
+                    raise ValueError(f"Duplicated label symbol: {symbol}.")
+                labels[symbol] = len(words)
+
+        # Fix up labels, and the others are variables
+        symbols.update(labels)
+        ram_address = assembler.Assembler.ram_predefined
+        for index, symbol in refs:
+            address = symbols.get(symbol)
+            if address is None:
+                address = symbols[symbol] = ram_address
+                ram_address += 1
+            words[index] = address
+
+        return words
+
+    @property
+    def report(self) -> Optional["vmtranslator.CostReport"]:
+        """Cost report, `None` unless enabled."""
+
+        return self._writer.report
+
+    @property
+    def source_map(self) -> Optional["sourcemap.SourceMap"]:
+        """Map from assemble line to VM file and line, `None` unless
+        enabled."""
+
+        return self._writer.source_map
+
+    @property
+    def removed(self) -> List[str]:
+        """Names of functions removed by dead function elimination."""
+
+        return self._eliminator.removed if self._eliminator else []
+
+    @property
+    def inlined(self) -> Dict[str, int]:
+        """Function name -> number of inlined call sites."""
+
+        return self._inliner.inlined if self._inliner else {}
+
+    def _iter_program(self, path: Union[str, pathlib.Path],
+                      lazy: bool = False
+                      ) -> Iterator[Tuple[str, Iterable[
+                          "vmtranslator.VMInstruction"]]]:
+        """Parses .vm files and writes bootstrap code for a folder.
+
+        Files are opened one by one, unless whole-program passes are
+        enabled.
+
+        Args:
+            path (str or pathlib.Path): Path to .vm file or folder.
+            lazy (bool, optional): If `True` and no whole-program pass is
+                enabled, yields commands parsed while they are consumed,
+                which must be done before the next file.
+
+        Yields:
+            file_name (str): Name of file, in sorted order of files.
+            instructions (iterable of VMInstruction): Parsed VM code, a list
+                unless `lazy`.
+
+        Raises:
+            ValueError: If given path specifies a single file and its suffix is
+                not '.vm'.
+        """
+
         input_path = pathlib.Path(path)
         if input_path.is_dir():
-            files = list(input_path.glob("*.vm"))
             self._writer.write_init()
+            files = sorted(input_path.glob("*.vm"))
+        elif input_path.suffix != ".vm":
+            raise ValueError(f"Expected .vm file, but given {input_path}.")
         else:
-            if input_path.suffix != ".vm":
-                raise ValueError(f"Expected .vm file, but given {input_path}.")
             files = [input_path]
 
+        if (self._folder is None and self._inliner is None
+                and self._eliminator is None):
+            for p in files:
+                with p.open("r") as f:
+                    if lazy:
+                        yield p.stem.upper(), self._parser.iter_parse(f)
+                    else:
+                        yield p.stem.upper(), self._parser.parse(f)
+            return
+
+        program = {}
         for p in files:
             with p.open("r") as f:
-                lines = f.readlines()
-            self._parser.code = lines
-            self._writer.line_num = 0
-            self._writer.file_name = p.stem.upper()
-
-            while True:
-                if self._parser.is_invalid():
-                    pass
-                elif self._parser.is_arithmetic():
-                    self._writer.write_arithmetic(self._parser.command)
-                elif self._parser.is_push():
-                    self._writer.write_push(
-                        self._parser.arg1, self._parser.arg2)
-                elif self._parser.is_pop():
-                    self._writer.write_pop(
-                        self._parser.arg1, self._parser.arg2)
-                elif self._parser.is_call():
-                    self._writer.write_call(
-                        self._parser.arg1, self._parser.arg2)
-                elif self._parser.is_label():
-                    self._writer.write_label(self._parser.arg1)
-                elif self._parser.is_goto():
-                    self._writer.write_goto(self._parser.arg1)
-                elif self._parser.is_if():
-                    self._writer.write_if(self._parser.arg1)
-                elif self._parser.is_return():
-                    self._writer.write_return()
-                elif self._parser.is_function():
-                    self._writer.write_function(
-                        self._parser.arg1, self._parser.arg2)
-                else:
-                    raise NotImplementedError(
-                        f"Unknown line: {self._parser.current}")
-
-                try:
-                    self._parser.advance()
-                    self._writer.line_num += 1
-                except RuntimeError:
-                    break
+                program[p.stem.upper()] = self._parser.parse(f)
 
-        return self._writer.code
+        if self._folder is not None:
+            program = self._folder.fold(program)
+        if self._inliner is not None:
+            self._inliner.bootstrap = input_path.is_dir()
+            program = self._inliner.inline(program)
+        if self._eliminator is not None:
+            program = self._eliminator.eliminate(program)
+
+        yield from program.items()
+
+    def _translate_file(self, file_name: str,
+                        instructions: Iterable["vmtranslator.VMInstruction"]
+                        ) -> None:
+        """Translates parsed code of single .vm file.
+
+        Args:
+            file_name (str): Name of file.
+            instructions (iterable of VMInstruction): Parsed VM code.
+        """
+
+        self._writer.start_file(file_name)
+        for _ in self._iter_write(instructions):
+            pass
+
+    def _iter_write(self, instructions: Iterable["vmtranslator.VMInstruction"]
+                    ) -> Iterator[int]:
+        """Writes instructions of one file through dispatch table.
+
+        Commands are consumed through a window of the longest fused
+        pattern, so a lazily parsed file is not read ahead any further.
+
+        Args:
+            instructions (iterable of VMInstruction): Parsed VM code.
+
+        Yields:
+            n (int): Position of the next command, after each write.
+        """
+
+        in_loop = None
+        if self._writer.compare == "auto":
+            instructions = list(instructions)
+            in_loop = self._find_loops(instructions)
+
+        dispatch = self._dispatch
+        writer = self._writer
+        names = vmtranslator.opcode_names
+        size = max(self._fusion_lengths.values())
+        rest = iter(instructions)
+        window = list(itertools.islice(rest, size))
+        n = 0
+        while window:
+            inst = window[0]
+            writer.line_num = inst.line
+            if in_loop is not None:
+                writer.in_loop = bool(in_loop[n])
+            start = len(writer.lines)
+            step = 1
+            fused = self._write_fused(window, 0) if self._fuse else ""
+            if fused:
+                self.fusion_hits[fused] += 1
+                writer.record(fused, start)
+                step = self._fusion_lengths[fused]
+            else:
+                dispatch[inst.opcode](inst)
+                writer.record(names[inst.opcode], start)
+            del window[:step]
+            window += itertools.islice(rest, step)
+            n += step
+            yield n
+
+    def _write_fused(self, instructions: List["vmtranslator.VMInstruction"],
+                     n: int) -> str:
+        """Writes a sequence of `fusion_catalog` starting at given position.
+
+        Args:
+            instructions (list of VMInstruction): Parsed VM code.
+            n (int): Position of the first command.
+
+        Returns:
+            name (str): Name of matched pattern, empty if nothing matched.
+        """
+
+        op = vmtranslator.Opcode
+        segments = vmtranslator.segment_names
+        window = instructions[n:n + 4]
+        codes = [inst.opcode for inst in window]
+        if codes[0] != op.PUSH:
+            return ""
+
+        first = window[0]
+        offset = 0
+        if (len(window) >= 3 and codes[1] == op.PUSH
+                and window[1].segment == vmtranslator.Segment.CONSTANT
+                and codes[2] in (op.ADD, op.SUB)):
+            offset = window[1].index
+            if codes[2] == op.SUB:
+                offset = -offset
+
+        if offset and len(window) == 4 and codes[3] == op.POP:
+            self._writer.write_move(
+                segments[first.segment], str(first.index),
+                segments[window[3].segment], str(window[3].index), offset)
+            return "move_add"
+        elif offset:
+            self._writer.write_push_add(
+                segments[first.segment], str(first.index), offset)
+            return "push_add"
+        elif len(window) >= 2 and codes[1] == op.POP:
+            self._writer.write_move(
+                segments[first.segment], str(first.index),
+                segments[window[1].segment], str(window[1].index))
+            return "move"
+        elif (first.segment == vmtranslator.Segment.CONSTANT
+                and len(window) >= 2 and codes[1] in (op.ADD, op.SUB)):
+            self._writer.write_add_constant(
+                first.index if codes[1] == op.ADD else -first.index)
+            return "add_constant"
+
+        return ""
+
+    @staticmethod
+    def _find_loops(instructions: List["vmtranslator.VMInstruction"]
+                    ) -> bytearray:
+        """Finds commands between a label and a later jump to it.
+
+        Args:
+            instructions (list of VMInstruction): Parsed VM code.
+
+        Returns:
+            in_loop (bytearray): 1 for commands in a loop, otherwise 0.
+        """
+
+        in_loop = bytearray(len(instructions))
+        labels: Dict[Tuple[str, str], int] = {}
+        func_name = ""
+        for n, inst in enumerate(instructions):
+            if inst.opcode == vmtranslator.Opcode.FUNCTION:
+                func_name = inst.name
+            elif inst.opcode == vmtranslator.Opcode.LABEL:
+                labels[(func_name, inst.name)] = n
+            elif (inst.opcode == vmtranslator.Opcode.GOTO
+                    or inst.opcode == vmtranslator.Opcode.IF_GOTO):
+                start = labels.get((func_name, inst.name))
+                if start is not None:
+                    in_loop[start:n + 1] = b"\x01" * (n + 1 - start)
+
+        return in_loop
+
+
+def _translate_file(file_name: str,
+                    instructions: List["vmtranslator.VMInstruction"],
+                    options: dict, bootstrap: bool
+                    ) -> Tuple[List[str], Dict[str, int],
+                               Optional["vmtranslator.CostReport"],
+                               Optional["sourcemap.SourceMap"], int]:
+    """Worker of `VMTranslator.translate_parallel`.
+
+    Args:
+        file_name (str): Name of file.
+        instructions (list of VMInstruction): Parsed VM code.
+        options (dict): Arguments of `VMTranslator`.
+        bootstrap (bool): Whether bootstrap code is written, which defines
+            shared routines.
+
+    Returns:
+        code (list of str): Translated code of the file.
+        fusion_hits (dict): Number of matches per fused pattern.
+        report (CostReport or None): Costs of the file if enabled.
+        source_map (SourceMap or None): Map of the file if enabled.
+        start (int): Position of `code` in `source_map`.
+    """
+
+    translator = VMTranslator(**options)
+    if bootstrap:
+        translator._writer.write_init()
+        if translator.report is not None:
+            translator.report.records.clear()
+        if translator.source_map is not None:
+            translator._writer.source_map = sourcemap.SourceMap()
+    start = len(translator._writer.lines)
+    translator._translate_file(file_name, instructions)
+    translator._writer.start_file("")
+
+    return (translator._writer.lines[start:], translator.fusion_hits,
+            translator.report, translator.source_map, start)
@@ -1,5 +1,107 @@
+from typing import Iterable, Iterator, List, Optional
+
+import enum
+
+
+class Opcode(enum.IntEnum):
+    """Opcode of VM command."""
+
+    ADD = 0
+    SUB = 1
+    NEG = 2
+    EQ = 3
+    GT = 4
+    LT = 5
+    AND = 6
+    OR = 7
+    NOT = 8
+    PUSH = 9
+    POP = 10
+    LABEL = 11
+    GOTO = 12
+    IF_GOTO = 13
+    FUNCTION = 14
+    CALL = 15
+    RETURN = 16
+
+
+class Segment(enum.IntEnum):
+    """Memory segment of push and pop commands."""
+
+    NONE = 0
+    ARGUMENT = 1
+    LOCAL = 2
+    STATIC = 3
+    CONSTANT = 4
+    THIS = 5
+    THAT = 6
+    POINTER = 7
+    TEMP = 8
+
+
+# VM names indexed by enum
+opcode_names = ["add", "sub", "neg", "eq", "gt", "lt", "and", "or", "not",
+                "push", "pop", "label", "goto", "if-goto", "function", "call",
+                "return"]
+segment_names = ["", "argument", "local", "static", "constant", "this", "that",
+                 "pointer", "temp"]
+
+_opcode_table = {name: Opcode(n) for n, name in enumerate(opcode_names)}
+_segment_table = {name: Segment(n) for n, name in enumerate(segment_names)
+                  if name}
+
+
+class VMInstruction:
+    """Parsed VM command.
+
+    Attributes:
+        opcode (Opcode): Command.
+        segment (Segment): Segment of push and pop, otherwise `NONE`.
+        index (int): Index of push and pop, number of locals of function and
+            number of args of call, otherwise 0.
+        name (str): Label of label, goto and if-goto, or function name of
+            function and call, otherwise empty.
+        line (int): Line number in source file.
+    """
+
+    __slots__ = ("opcode", "segment", "index", "name", "line")
+
+    def __init__(self, opcode: Opcode, segment: Segment = Segment.NONE,
+                 index: int = 0, name: str = "", line: int = 0):
+
+        self.opcode = opcode
+        self.segment = segment
+        self.index = index
+        self.name = name
+        self.line = line
+
+    def __repr__(self) -> str:
+
+        return (f"VMInstruction({self.opcode.name}, {self.segment.name}, "
+                f"{self.index}, {self.name!r}, line={self.line})")
+
+    def __str__(self) -> str:
+
+        command = opcode_names[self.opcode]
+        if self.opcode in (Opcode.PUSH, Opcode.POP):
+            return f"{command} {segment_names[self.segment]} {self.index}"
+        elif self.opcode in (Opcode.FUNCTION, Opcode.CALL):
+            return f"{command} {self.name} {self.index}"
+        elif self.opcode in (Opcode.LABEL, Opcode.GOTO, Opcode.IF_GOTO):
+            return f"{command} {self.name}"
+        return command
+
+    def __eq__(self, other: object) -> bool:
+
+        if not isinstance(other, VMInstruction):
+            return NotImplemented
+
+        return (self.opcode == other.opcode and self.segment == other.segment
+                and self.index == other.index and self.name == other.name)
 
-from typing import List
+    def __hash__(self) -> int:
+
+        return hash((self.opcode, self.segment, self.index, self.name))
 
 
 class VMParser:
@@ -17,12 +119,95 @@ class VMParser:
     c_return = 8
     c_call = 9
 
+    # Opcode -> command type
+    command_table = ([c_arithmetic] * 9
+                     + [c_push, c_pop, c_label, c_goto, c_if, c_function,
+                        c_call, c_return])
+
     def __init__(self):
 
         self._code: List[str] = []
+        self._instructions: List[Optional[VMInstruction]] = []
         self._length = 0
         self._index = 0
         self._current = ""
+        self._current_inst: Optional[VMInstruction] = None
+
+    @classmethod
+    def parse_line(cls, line: str, line_num: int = 0
+                   ) -> Optional[VMInstruction]:
+        """Parses single line of code.
+
+        Args:
+            line (str): Line of VM code.
+            line_num (int, optional): Line number.
+
+        Returns:
+            instruction (VMInstruction or None): Parsed command, `None` for
+                empty line.
+
+        Raises:
+            ValueError: If unexpected command is given.
+        """
+
+        # Remove comments
+        # ex) "push constant 1  // comment" -> "push constant 1"
+        command = line.split("//")[0].split()
+        if not command:
+            return None
+
+        opcode = _opcode_table.get(command[0])
+        try:
+            if opcode is None:
+                raise ValueError
+            elif opcode == Opcode.PUSH or opcode == Opcode.POP:
+                _, segment, index = command
+                return VMInstruction(opcode, _segment_table[segment],
+                                     int(index), line=line_num)
+            elif opcode == Opcode.FUNCTION or opcode == Opcode.CALL:
+                _, name, index = command
+                return VMInstruction(opcode, index=int(index), name=name,
+                                     line=line_num)
+            elif (opcode == Opcode.LABEL or opcode == Opcode.GOTO
+                    or opcode == Opcode.IF_GOTO):
+                _, name = command
+                return VMInstruction(opcode, name=name, line=line_num)
+            elif len(command) == 1:
+                return VMInstruction(opcode, line=line_num)
+        except (KeyError, ValueError):
+            pass
+
+        raise ValueError(f"Unexpected command: {line.strip()}")
+
+    @classmethod
+    def parse(cls, code: Iterable[str]) -> List[VMInstruction]:
+        """Parses lines to instruction list.
+
+        Args:
+            code (iterable of str): VM code.
+
+        Returns:
+            instructions (list of VMInstruction): Parsed commands without
+                empty lines.
+        """
+
+        return list(cls.iter_parse(code))
+
+    @classmethod
+    def iter_parse(cls, code: Iterable[str]) -> Iterator[VMInstruction]:
+        """Parses lines lazily, e.g. directly from an open file.
+
+        Args:
+            code (iterable of str): VM code.
+
+        Yields:
+            instruction (VMInstruction): Parsed command.
+        """
+
+        for line_num, line in enumerate(code):
+            inst = cls.parse_line(line, line_num)
+            if inst is not None:
+                yield inst
 
     @property
     def current(self) -> str:
@@ -35,10 +220,18 @@ class VMParser:
     @code.setter
     def code(self, code: List[str]) -> None:
         self._code = code
+        self._instructions = [self.parse_line(line, n)
+                              for n, line in enumerate(code)]
         self._length = len(code)
         self._index = 0
         self.advance()
 
+    @property
+    def instructions(self) -> List[VMInstruction]:
+        """Parsed commands of `code` without empty lines."""
+
+        return [inst for inst in self._instructions if inst is not None]
+
     def has_more_commands(self) -> bool:
         """Check whether command exists in input.
 
@@ -61,6 +254,7 @@ class VMParser:
         # Remove comments
         # ex) "D=A  // comment" -> "D=A"
         self._current = self._code[self._index].split("//")[0].strip()
+        self._current_inst = self._instructions[self._index]
         self._index += 1
 
     @property
@@ -69,36 +263,12 @@ class VMParser:
 
         Returns:
             command_type (int): parsed current command type.
-
-        Raises:
-            ValueErorr: If unexpected command is given.
         """
 
-        if not self._current:
+        if self._current_inst is None:
             return self.c_invalid
 
-        command = self._current.split(" ")[0]
-        if command == "push":
-            return self.c_push
-        elif command == "pop":
-            return self.c_pop
-        elif command == "label":
-            return self.c_label
-        elif command == "goto":
-            return self.c_goto
-        elif command == "if-goto":
-            return self.c_if
-        elif command == "function":
-            return self.c_function
-        elif command == "return":
-            return self.c_return
-        elif command == "call":
-            return self.c_call
-        elif (command in
-                ["add", "sub", "neg", "eq", "gt", "lt", "and", "or", "not"]):
-            return self.c_arithmetic
-
-        raise ValueError(f"Unexpected command: {self._current}")
+        return self.command_table[self._current_inst.opcode]
 
     def is_invalid(self) -> bool:
         return self.command_type == self.c_invalid
@@ -138,8 +308,10 @@ class VMParser:
             command (str): Parsed command.
         """
 
-        command, *_ = self._current.split(" ")
-        return command
+        if self._current_inst is None:
+            return ""
+
+        return opcode_names[self._current_inst.opcode]
 
     @property
     def arg1(self) -> str:
@@ -152,14 +324,15 @@ class VMParser:
             AttributeError: If `command_type` is not expected one.
         """
 
-        if self.command_type == self.c_return:
+        if self.command_type in [self.c_invalid, self.c_return]:
             raise AttributeError(f"Invalid command type: {self.command_type}")
 
+        inst = self._current_inst
         if self.command_type == self.c_arithmetic:
-            return self._current
-
-        _, arg1, *_ = self._current.split(" ")
-        return arg1
+            return opcode_names[inst.opcode]
+        elif self.command_type in [self.c_push, self.c_pop]:
+            return segment_names[inst.segment]
+        return inst.name
 
     @property
     def arg2(self) -> str:
@@ -176,5 +349,4 @@ class VMParser:
                 [self.c_push, self.c_pop, self.c_function, self.c_call]):
             raise AttributeError(f"Invalid command type: {self.command_type}")
 
-        *_, arg2 = self._current.split(" ")
-        return arg2
+        return str(self._current_inst.index)
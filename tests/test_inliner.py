@@ -0,0 +1,94 @@
+
+import pathlib
+
+from nnttpy import vmtranslator
+
+
+SYS_VM = """\
+function Sys.init 0
+push constant 7
+call Foo.new 1
+pop static 0
+push static 0
+call Foo.get 1
+push constant 3
+push constant 4
+call Sys.add2 2
+add
+pop static 1
+push constant 10
+call Sys.getx 1
+pop static 2
+label END
+goto END
+function Sys.add2 0
+push argument 0
+push argument 1
+add
+return
+function Sys.getx 0
+push argument 0
+push constant 1
+add
+return
+"""
+
+FOO_VM = """\
+function Foo.new 0
+push constant 1
+call Memory.alloc 1
+pop pointer 0
+push argument 0
+pop this 0
+push pointer 0
+return
+function Foo.get 0
+push argument 0
+pop pointer 0
+push this 0
+return
+function Memory.alloc 0
+push constant 3000
+return
+"""
+
+
+def _write_program(path: pathlib.Path) -> pathlib.Path:
+
+    (path / "Sys.vm").write_text(SYS_VM)
+    (path / "Foo.vm").write_text(FOO_VM)
+    return path
+
+
+def _statics(program: dict) -> list:
+
+    interpreter = vmtranslator.VMInterpreter()
+    interpreter.load_program(program)
+    interpreter.run(10000)
+    return [interpreter.static(f"SYS.{n}") for n in range(3)]
+
+
+def test_inline_with_shared_calls(tmp_path):
+
+    path = _write_program(tmp_path)
+    translator = vmtranslator.VMTranslator(inline=True)
+    translator.translate(path)
+    shared = vmtranslator.VMTranslator(inline=True, shared_calls=True)
+    shared.translate(path)
+
+    expected = {"Foo.get", "Sys.add2", "Sys.getx"}
+    assert expected <= set(translator.inlined)
+    assert expected <= set(shared.inlined)
+
+
+def test_inline_keeps_results(tmp_path):
+
+    path = _write_program(tmp_path)
+    program = {p.stem.upper(): vmtranslator.VMParser.parse(p.read_text()
+                                                           .splitlines())
+               for p in sorted(path.glob("*.vm"))}
+    inliner = vmtranslator.Inliner(writer_options={"shared_calls": True})
+    inlined = inliner.inline(program)
+
+    assert inliner.inlined
+    assert _statics(inlined) == _statics(program) == [3000, 14, 11]
@@ -0,0 +1,59 @@
+
+import pathlib
+
+from nnttpy import assembler, sourcemap, vmtranslator
+
+
+SYS_VM = """\
+function Sys.init 0
+push constant 7
+call Foo.get 1
+pop static 0
+label END
+goto END
+"""
+
+FOO_VM = """\
+function Foo.unused 0
+push constant 0
+push constant 0
+add
+push constant 0
+add
+return
+function Foo.get 0
+push argument 0
+push constant 1
+add
+return
+"""
+
+
+def test_inlined_code_maps_to_call_site(tmp_path):
+
+    (tmp_path / "Sys.vm").write_text(SYS_VM)
+    (tmp_path / "Foo.vm").write_text(FOO_VM)
+    translator = vmtranslator.VMTranslator(inline=True, source_map=True)
+    code = translator.translate(tmp_path)
+    assert translator.inlined == {"Foo.get": 1}
+
+    # Every mapped line holds the VM command of its file
+    files = {p.stem.upper(): p.read_text().splitlines()
+             for p in tmp_path.glob("*.vm")}
+    sources = {translator.source_map.lookup(n) for n in range(len(code))}
+    sources.discard(None)
+    for file_name, line in sources:
+        assert line < len(files[file_name])
+    assert ("SYS", 2) in sources
+    assert ("SYS", 3) in sources
+
+    # ROM addresses map to existing lines through both stages
+    hack_assembler = assembler.Assembler(code)
+    words = hack_assembler.assemble_words()
+    chain = sourcemap.SourceMapChain(
+        [hack_assembler.source_map(), translator.source_map])
+    for n in range(len(words)):
+        source = chain.lookup(n)
+        assert source is None or source[0] in ("SYS", "FOO")
+        if source is not None and source[0] == "SYS":
+            assert source[1] < len(files["SYS"])